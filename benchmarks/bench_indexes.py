@@ -0,0 +1,98 @@
+"""
+Contact index layouts compared: the single-column indexes of the initial schema against the per-user composite
+indexes of migration 8b4e6d2f1a53.
+
+    pip install pytest-benchmark
+    BENCH_CONTACTS=100000 pytest benchmarks/bench_indexes.py [--benchmark-autosave]
+
+Each layout gets its own copy of the seeded data set (see benchmarks.dataset) with the indexes of the other
+layout swapped out, then ANALYZE. insert times INSERT_ROWS new contacts in one transaction that is rolled back,
+so every round writes into the same table; the queries are the repository functions the API calls.
+"""
+import shutil
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from benchmarks.dataset import USERS, SEED
+from src.database.models import Contact, User
+from src.database.seed import generate_contacts, insert_rows
+from src.repository.contacts import birthday_list, get_contact, get_contacts
+
+INSERT_ROWS = 5000
+LAYOUTS = {
+    "before": {
+        "ix_contacts_id": "id",
+        "ix_contacts_name": "name",
+        "ix_contacts_surname": "surname",
+        "ix_contacts_birthday": "birthday",
+        "ix_contacts_additionally": "additionally",
+        "ix_contacts_user_id_birthday_ordinal": "user_id, birthday_ordinal",
+    },
+    "after": {
+        "ix_contacts_user_id_id": "user_id, id",
+        "ix_contacts_user_id_surname_name": "user_id, surname, name",
+        "ix_contacts_user_id_birthday_ordinal_id": "user_id, birthday_ordinal, id",
+    },
+}
+
+
+@pytest.fixture(scope="module", params=list(LAYOUTS))
+def layout(request, dataset, tmp_path_factory, loop):
+    path = tmp_path_factory.mktemp("indexes") / f"{request.param}.db"
+    shutil.copy(dataset, path)
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        for other, indexes in LAYOUTS.items():
+            for name, columns in indexes.items():
+                if other == request.param:
+                    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON contacts ({columns})"))
+                else:
+                    connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        connection.execute(text("ANALYZE"))
+        contacts = connection.scalar(text("SELECT max(id) FROM contacts"))
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    yield request.param, engine, async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False), contacts
+    loop.run_until_complete(async_engine.dispose())
+    engine.dispose()
+
+
+def test_insert(benchmark, layout):
+    name, engine, _, contacts = layout
+    rows = generate_contacts(contacts, contacts + INSERT_ROWS, list(range(1, USERS + 1)), SEED + 1)
+
+    def insert():
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            insert_rows(connection, Contact.__table__, rows)
+            transaction.rollback()
+
+    benchmark.group = f"insert[{INSERT_ROWS}]"
+    benchmark.pedantic(insert, rounds=15, warmup_rounds=1)
+    # No stats are collected under --benchmark-disable
+    if benchmark.stats:
+        benchmark.extra_info["rows_per_second"] = round(INSERT_ROWS / benchmark.stats["mean"])
+
+
+async def _page(session_factory):
+    async with session_factory() as db:
+        return await get_contacts(User(id=1), db, limit=100, after_id=USERS * 1000, rows=True)
+
+
+async def _contact(session_factory):
+    async with session_factory() as db:
+        return await get_contact(USERS * 1000 + 1, User(id=1), db)
+
+
+async def _birthdays(session_factory):
+    async with session_factory() as db:
+        return await birthday_list(User(id=1), db, days=30, rows=True)
+
+
+@pytest.mark.parametrize("query", ("page", "contact", "birthdays"))
+def test_query(benchmark, run, layout, query):
+    _, _, session_factory, _ = layout
+    func = {"page": _page, "contact": _contact, "birthdays": _birthdays}[query]
+    benchmark.group = f"query[{query}]"
+    benchmark(run, func, session_factory)
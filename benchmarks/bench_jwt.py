@@ -0,0 +1,37 @@
+"""
+Compare access token verification with each JWT backend and with the claims cache.
+
+    python -m benchmarks.bench_jwt [--number N]
+"""
+import argparse
+import asyncio
+import timeit
+
+from src.services.auth import Auth
+from src.services.jwt_backend import BACKENDS, get_jwt_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="decodes per measurement")
+    args = parser.parse_args()
+
+    auth = Auth()
+    token = asyncio.run(auth.create_access_token(data={"sub": "deadpool@example.com"}))
+    print(f"{'path':<20} {'us/decode':>10}")
+    for name in BACKENDS:
+        try:
+            backend = get_jwt_backend(name)
+        except ImportError:
+            print(f"{name:<20} {'not installed':>10}")
+            continue
+        decode = lambda: backend.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+        seconds = min(timeit.repeat(decode, number=args.number, repeat=5))
+        print(f"{name:<20} {seconds / args.number * 1e6:>10.2f}")
+    auth.decode_token(token)
+    seconds = min(timeit.repeat(lambda: auth.decode_token(token), number=args.number, repeat=5))
+    print(f"{'claims cache hit':<20} {seconds / args.number * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
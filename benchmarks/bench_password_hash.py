@@ -0,0 +1,66 @@
+"""
+Measure password hash and verify latency for candidate cost settings on this host.
+
+    python -m benchmarks.bench_password_hash [--samples N] [--target-ms MS]
+
+Run it on the deployment hardware and pick the strongest argon2id setting whose p99 stays
+under the login latency budget, then set ARGON2_TIME_COST / ARGON2_MEMORY_COST / ARGON2_PARALLELISM.
+"""
+import argparse
+import statistics
+import time
+
+from src.services.passwords import make_pwd_context
+
+ARGON2_GRID = [
+    # (time_cost, memory_cost KiB, parallelism)
+    (1, 47104, 1),
+    (2, 19456, 1),
+    (3, 12288, 1),
+    (3, 65536, 1),
+    (4, 65536, 2),
+]
+BCRYPT_GRID = [10, 12, 13]
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def measure(func, samples: int) -> list[float]:
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=20, help="hash and verify calls per setting")
+    parser.add_argument("--target-ms", type=float, default=250, help="p99 budget used to flag settings")
+    args = parser.parse_args()
+    password = "correct horse battery staple"
+
+    cases = []
+    for time_cost, memory_cost, parallelism in ARGON2_GRID:
+        context = make_pwd_context(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+        cases.append((f"argon2id t={time_cost} m={memory_cost} p={parallelism}", context, "argon2"))
+    for rounds in BCRYPT_GRID:
+        cases.append((f"bcrypt rounds={rounds}", make_pwd_context(bcrypt_rounds=rounds), "bcrypt"))
+
+    print(f"{'setting':<36} {'hash p50':>9} {'hash p99':>9} {'verify p50':>11} {'verify p99':>11}  within")
+    for name, context, scheme in cases:
+        handler = context.handler(scheme)
+        hashed = handler.hash(password)
+        hash_ms = measure(lambda: handler.hash(password), args.samples)
+        verify_ms = measure(lambda: context.verify(password, hashed), args.samples)
+        within = "yes" if percentile(verify_ms, 0.99) <= args.target_ms else "no"
+        print(f"{name:<36} {statistics.median(hash_ms):>9.1f} {percentile(hash_ms, 0.99):>9.1f} "
+              f"{statistics.median(verify_ms):>11.1f} {percentile(verify_ms, 0.99):>11.1f}  {within}")
+
+
+if __name__ == "__main__":
+    main()
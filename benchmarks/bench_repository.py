@@ -0,0 +1,63 @@
+"""
+Microbenchmarks of the hot repository and auth paths against seeded SQLite data sets.
+
+    pip install pytest-benchmark
+    BENCH_CONTACTS=1000,100000 pytest benchmarks/bench_repository.py [--benchmark-autosave]
+
+Data sets default to 1k, 100k and 1M contacts over ten users and are cached in .benchmarks/data
+(see benchmarks.dataset). Every call opens its own session, like a request does. Redis is fakeredis.
+"""
+import pytest
+
+from benchmarks.dataset import user_emails
+from src.database.models import User
+from src.repository.contacts import birthday_list, searcher
+from src.services.user_cache import user_cache_key
+
+# FTS trigram match, the ILIKE fallback for short terms, and a term without hits
+SEARCH_TERMS = ("Smith", "ol", "Zzyzx")
+
+
+async def _search(session_factory, term):
+    async with session_factory() as db:
+        return await searcher(term, User(id=1), db)
+
+
+async def _birthdays(session_factory, days):
+    async with session_factory() as db:
+        return await birthday_list(User(id=1), db, days=days)
+
+
+async def _current_user(session_factory, auth, token):
+    async with session_factory() as db:
+        return await auth.get_current_user(token, db)
+
+
+@pytest.mark.parametrize("term", SEARCH_TERMS)
+def test_searcher(benchmark, run, session_factory, term):
+    benchmark.group = f"searcher[{term}]"
+    benchmark(run, _search, session_factory, term)
+
+
+@pytest.mark.parametrize("days", (7, 30))
+def test_birthday_list(benchmark, run, session_factory, days):
+    benchmark.group = f"birthday_list[{days}]"
+    benchmark(run, _birthdays, session_factory, days)
+
+
+@pytest.mark.parametrize("source", ("local", "redis", "database"))
+def test_get_current_user(benchmark, run, dataset, session_factory, auth, source):
+    email = user_emails(dataset)[1]
+    token = run(auth.create_access_token, data={"sub": email})
+
+    def setup():
+        if source != "local":
+            auth.user_cache.clear()
+        if source == "database":
+            run(auth.r.delete, user_cache_key(email))
+
+    run(_current_user, session_factory, auth, token)
+    benchmark.group = f"get_current_user[{source}]"
+    user = benchmark.pedantic(run, args=(_current_user, session_factory, auth, token), setup=setup,
+                              rounds=200, warmup_rounds=5)
+    assert user.email == email
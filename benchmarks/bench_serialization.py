@@ -0,0 +1,77 @@
+"""
+Serialization of contact list responses: FastAPI's response_model path against plain rows encoded with orjson.
+
+    pip install pytest-benchmark
+    pytest benchmarks/bench_serialization.py [--benchmark-autosave]
+
+encode_*  only the encoding of a page that is already loaded
+list_*    the page read from SQLite and encoded, as GET /api/contacts/all does on a cache miss
+
+response_model   ORM objects, validated one by one through ResponseContact (orm_mode) and encoded with json,
+                 the way FastAPI answers when a route returns them
+rows             the ResponseContact columns as dicts (rows=True), encoded with orjson as they are
+"""
+from typing import List
+
+import orjson
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from benchmarks.dataset import USERS, ensure_dataset
+from src.database.models import User
+from src.repository.contacts import get_contacts
+from src.schemas import ResponseContact
+
+COUNTS = (1000, 10000)
+FIELD = create_response_field(name="Response_get_contacts", type_=List[ResponseContact])
+
+
+@pytest.fixture(scope="module")
+def contacts_db(loop):
+    # User 1 owns max(COUNTS) contacts
+    engine = create_async_engine(f"sqlite+aiosqlite:///{ensure_dataset(max(COUNTS) * USERS)}")
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    loop.run_until_complete(engine.dispose())
+
+
+async def _load(session_factory, count, rows):
+    async with session_factory() as db:
+        return await get_contacts(User(id=1), db, limit=count, rows=rows)
+
+
+async def _response_model(contacts):
+    content = await serialize_response(field=FIELD, response_content=contacts, exclude_unset=True)
+    return JSONResponse(content).body
+
+
+def _rows(contacts):
+    return orjson.dumps(contacts)
+
+
+async def _list(session_factory, count, rows):
+    contacts = await _load(session_factory, count, rows)
+    return _rows(contacts) if rows else await _response_model(contacts)
+
+
+@pytest.mark.parametrize("count", COUNTS)
+@pytest.mark.parametrize("path", ("response_model", "rows"))
+def test_encode(benchmark, run, contacts_db, count, path):
+    contacts = run(_load, contacts_db, count, path == "rows")
+    assert len(contacts) == count
+    benchmark.group = f"encode[{count}]"
+    if path == "rows":
+        body = benchmark(_rows, contacts)
+    else:
+        body = benchmark(run, _response_model, contacts)
+    assert len(orjson.loads(body)) == count
+
+
+@pytest.mark.parametrize("count", COUNTS)
+@pytest.mark.parametrize("path", ("response_model", "rows"))
+def test_list(benchmark, run, contacts_db, count, path):
+    benchmark.group = f"list[{count}]"
+    body = benchmark(run, _list, contacts_db, count, path == "rows")
+    assert len(orjson.loads(body)) == count
@@ -0,0 +1,50 @@
+"""
+Compare the pickled ORM user with the compact user cache record.
+
+    python -m benchmarks.bench_user_cache [--number N]
+"""
+import argparse
+import pickle
+import timeit
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.database.models import Base, User
+from src.services.user_cache import dump_user, load_user
+
+
+def loaded_user() -> User:
+    # A user that went through a session, like the one get_current_user used to pickle
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as session:
+        session.add(User(username="deadpool", email="deadpool@example.com", password="$2b$12$" + "x" * 53,
+                         avatar="https://www.gravatar.com/avatar/0123456789abcdef0123456789abcdef",
+                         refresh_token="y" * 200, confirmed=True))
+        session.commit()
+        user = session.query(User).first()
+    return user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="iterations per measurement")
+    args = parser.parse_args()
+
+    user = loaded_user()
+    pickled = pickle.dumps(user)
+    record = dump_user(user)
+    cases = {
+        "pickle": (lambda: pickle.dumps(user), lambda: pickle.loads(pickled), pickled),
+        "record": (lambda: dump_user(user), lambda: load_user(record), record),
+    }
+    print(f"{'format':<8} {'bytes':>6} {'encode us':>10} {'decode us':>10}")
+    for name, (encode, decode, payload) in cases.items():
+        encode_us = min(timeit.repeat(encode, number=args.number, repeat=5)) / args.number * 1e6
+        decode_us = min(timeit.repeat(decode, number=args.number, repeat=5)) / args.number * 1e6
+        print(f"{name:<8} {len(payload):>6} {encode_us:>10.2f} {decode_us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
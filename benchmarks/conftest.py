@@ -0,0 +1,46 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from benchmarks.dataset import ensure_dataset, sizes
+from src.services.auth import auth_service
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def run(loop):
+    # pytest-benchmark times plain callables, so every coroutine is driven to completion on one loop
+    def run(func, *args, **kwargs):
+        return loop.run_until_complete(func(*args, **kwargs))
+    return run
+
+
+@pytest.fixture(scope="session", params=sizes(), ids=lambda size: f"{size}-contacts")
+def dataset(request):
+    return ensure_dataset(request.param)
+
+
+@pytest.fixture(scope="session")
+def session_factory(dataset, loop):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{dataset}")
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    loop.run_until_complete(engine.dispose())
+
+
+@pytest.fixture(scope="session")
+def auth():
+    redis = auth_service.r
+    auth_service.r = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    auth_service.user_cache.clear()
+    yield auth_service
+    auth_service.r = redis
+    auth_service.user_cache.clear()
@@ -0,0 +1,70 @@
+"""
+Deterministic contact books for the benchmarks.
+
+Every data set is a SQLite file seeded by src.database.seed with USERS users and the contacts spread
+over them round-robin, so user 1 owns contacts // USERS of them and contact ids k * USERS + user_id.
+Files are cached in BENCH_DATA_DIR (.benchmarks/data) and only rebuilt when missing.
+"""
+import os
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+
+from src.database.models import Contact, User
+from src.database.seed import seed
+
+BENCH_DATA_DIR = Path(os.environ.get("BENCH_DATA_DIR", ".benchmarks/data"))
+USERS = 10
+SEED = 0
+
+
+def ensure_dataset(contacts: int, users: int = USERS) -> Path:
+    """
+    The ensure_dataset function returns the path of the cached data set, seeding it first if needed.
+
+    :param contacts: int: How many contacts the data set has
+    :param users: int: How many users own them
+    :return: Path of the SQLite file
+    """
+    path = BENCH_DATA_DIR / f"contacts-{contacts}-users-{users}-seed-{SEED}.db"
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        if path.exists():
+            try:
+                with engine.connect() as connection:
+                    if connection.scalar(select(func.count()).select_from(Contact)) == contacts:
+                        return path
+            except OperationalError:
+                # A stale file from an older schema
+                pass
+        path.parent.mkdir(parents=True, exist_ok=True)
+        seed(engine, contacts, users, seed=SEED, workers=os.cpu_count() or 1, reset=True)
+        return path
+    finally:
+        engine.dispose()
+
+
+def user_emails(path: Path) -> dict[int, str]:
+    """
+    The user_emails function maps the user ids of a data set to their emails, to mint tokens for them.
+
+    :param path: Path: Path of the SQLite file
+    :return: A dict of user id to email
+    """
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as connection:
+            return dict(connection.execute(select(User.id, User.email)).all())
+    finally:
+        engine.dispose()
+
+
+def sizes(default: str = "1000,100000,1000000") -> list[int]:
+    """
+    The sizes function reads the data set sizes to run against from BENCH_CONTACTS.
+
+    :param default: str: Comma separated sizes used when the variable is not set
+    :return: A list of contact counts
+    """
+    return [int(size) for size in os.environ.get("BENCH_CONTACTS", default).split(",") if size.strip()]
@@ -0,0 +1,166 @@
+"""
+HTTP load scenario against the app in-process, with a seeded SQLite data set and fakeredis.
+
+    python -m benchmarks.load_http [--contacts N] [--requests N] [--concurrency N] [--scenario NAME]
+
+Requests go through the whole ASGI stack (middlewares, auth, rate limiter, serialization) via
+httpx.AsyncClient, so there is no network in the numbers. The rate limits are raised to the number of requests:
+the limiter still runs, with its usual batching, but never answers 429. Prints p50/p95/p99 latency per endpoint and req/s overall.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+from collections import defaultdict
+
+import fakeredis
+import fakeredis.aioredis
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from benchmarks.dataset import SEED, USERS, ensure_dataset, user_emails
+from main import app
+from src.database.connect import get_db
+from src.database import query_stats
+from src.database.query_stats import track_queries
+from src.database.seed import name_pools
+from src.services.auth import auth_service
+from src.services.rate_limit import Limit, rate_limiter
+from src.services.response_cache import response_cache
+
+SCENARIOS = {
+    "mixed": {"get": 4, "list": 2, "search": 2, "birthdays": 1},
+    "get": {"get": 1},
+    "list": {"list": 1},
+    "search": {"search": 1},
+    "birthdays": {"birthdays": 1},
+}
+
+
+def plan(scenario: str, requests: int, contacts: int, seed: int) -> list[tuple[str, int, str]]:
+    """
+    The plan function draws the requests of a run up front, so every run of the same arguments is the same.
+
+    :param scenario: str: Name of the endpoint mix in SCENARIOS
+    :param requests: int: How many requests to draw
+    :param contacts: int: Size of the data set
+    :param seed: int: Seed of the random generator
+    :return: A list of (endpoint, user id, url path)
+    """
+    rng = random.Random(seed)
+    _, surnames, _ = name_pools(SEED)
+    weights = SCENARIOS[scenario]
+    endpoints = rng.choices(list(weights), weights=list(weights.values()), k=requests)
+    per_user = contacts // USERS
+    result = []
+    for endpoint in endpoints:
+        user_id = rng.randint(1, USERS)
+        if endpoint == "get":
+            path = f"/api/contacts/{rng.randrange(per_user) * USERS + user_id}"
+        elif endpoint == "list":
+            path = "/api/contacts/all?limit=100"
+        elif endpoint == "search":
+            path = f"/api/contacts/search{rng.choice(surnames)[:rng.randint(3, 6)]}"
+        else:
+            path = "/api/contacts/bday?days=7"
+        result.append((endpoint, user_id, path))
+    return result
+
+
+def percentiles(latencies: list[float]) -> tuple[float, float, float]:
+    if len(latencies) < 2:
+        value = latencies[0] if latencies else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def print_row(name: str, latencies: list[float], statuses: dict[str, int]) -> None:
+    p50, p95, p99 = percentiles(latencies)
+    print(f"{name:<10} {len(latencies):>6} {statuses.get('4xx', 0):>5} {statuses.get('5xx', 0):>5} "
+          f"{p50 * 1e3:>8.2f} {p95 * 1e3:>8.2f} {p99 * 1e3:>8.2f}")
+
+
+async def run(args) -> None:
+    path = ensure_dataset(args.contacts)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    track_queries(engine)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    redis = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    auth_service.r = redis
+    response_cache.redis = redis
+    auth_service.user_cache.clear()
+    rate_limiter.redis = redis
+    rate_limiter.leases.clear()
+    rate_limiter.limits = {name: Limit(args.warmup + args.requests, 60) for name in rate_limiter.limits}
+
+    headers = {}
+    for user_id, email in user_emails(path).items():
+        token = await auth_service.create_access_token(data={"sub": email})
+        headers[user_id] = {"Authorization": f"Bearer {token}"}
+
+    requests = plan(args.scenario, args.warmup + args.requests, args.contacts, args.seed)
+    warmup, requests = requests[:args.warmup], requests[args.warmup:]
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        async def worker(queue, record):
+            for endpoint, user_id, url in queue:
+                start = time.perf_counter()
+                response = await client.get(url, headers=headers[user_id])
+                elapsed = time.perf_counter() - start
+                if record:
+                    latencies[endpoint].append(elapsed)
+                    statuses[endpoint][f"{response.status_code // 100}xx"] += 1
+
+        async def drive(batch, record):
+            queue = iter(batch)
+            await asyncio.gather(*(worker(queue, record) for _ in range(args.concurrency)))
+
+        await drive(warmup, record=False)
+        start = time.perf_counter()
+        await drive(requests, record=True)
+        wall = time.perf_counter() - start
+
+    await engine.dispose()
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.contacts} contacts, "
+          f"scenario {args.scenario}")
+    # A search without hits answers 404, so 4xx is not necessarily an error
+    print(f"{'endpoint':<10} {'count':>6} {'4xx':>5} {'5xx':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    everything, total = [], defaultdict(int)
+    for endpoint in sorted(latencies):
+        everything.extend(latencies[endpoint])
+        for code, count in statuses[endpoint].items():
+            total[code] += count
+        print_row(endpoint, latencies[endpoint], statuses[endpoint])
+    print_row("total", everything, total)
+    print(f"throughput {len(everything) / wall:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=100000, help="size of the seeded data set")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=200, help="requests sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed", help="endpoint mix")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the request plan")
+    parser.add_argument("--log-slow-queries", action="store_true", help="keep the slow query warnings")
+    args = parser.parse_args()
+    if not args.log_slow_queries:
+        # Under load nearly every statement waits long enough to count as slow
+        logging.getLogger(query_stats.__name__).setLevel(logging.ERROR)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,40 @@
 import time
 
-import redis.asyncio as redis
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_limiter import FastAPILimiter
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.conf.config import settings
-from src.database.connect import get_db
+from src.database.connect import get_db, async_engine
+from src.database.pool_metrics import pool_status
+from src.database.query_stats import track_queries, count_queries, report_request, DEBUG_QUERY_HEADERS
 from src.routes import contacts, auth
+from src.services.auth import auth_service
+from src.services.redis_pool import close_redis
 from src.services.messages import DB_CONFIG_ERROR, DB_CONNECT_ERROR, WELCOME_MESSAGE
+from src.services.metrics import IN_PROGRESS, REQUEST_LATENCY, REQUESTS, route_label, register_gauge, \
+    register_counter
 
 app = FastAPI()
 
+track_queries(async_engine)
+register_gauge("db_pool_checked_out", "Database connections in use",
+               lambda: pool_status(async_engine).get("checked_out", 0))
+register_gauge("db_pool_size", "Database connections kept in the pool",
+               lambda: pool_status(async_engine).get("size", 0))
+register_counter("db_pool_checkout_timeouts", "Checkouts that hit the pool timeout",
+                 lambda: pool_status(async_engine)["timeouts"])
+register_gauge("hashing_pool_in_flight", "Password hashing jobs running or queued",
+               lambda: auth_service.hashing_pool.in_flight)
+register_counter("hashing_pool_rejected", "Password hashing jobs rejected with 503",
+                 lambda: auth_service.hashing_pool.rejected)
+register_counter("user_cache_hits", "Authenticated user lookups served by the local cache",
+                 lambda: auth_service.user_cache.hits)
+register_counter("user_cache_misses", "Authenticated user lookups that went to Redis",
+                 lambda: auth_service.user_cache.misses)
+
 origins = [
     "http://localhost:3000"
 ]
@@ -25,20 +45,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients read the next page cursor and the ETag to revalidate with
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
-@app.on_event("startup")
-async def startup():
+@app.on_event("shutdown")
+async def shutdown():
     """
-    The startup function is called when the application starts up.
-    It's a good place to initialize things that are used by the app, such as databases or caches.
+    The shutdown function is called when the application stops and releases the Redis connections
+    and the password hashing workers.
 
-    :return: A dictionary with the following keys:
+    :return: None
     """
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
+    await close_redis()
+    auth_service.hashing_pool.shutdown()
 
 
 @app.middleware("http")
@@ -46,18 +67,47 @@ async def add_process_time_header(request: Request, call_next):
     """
     The add_process_time_header function adds a header to the response called &quot;My-Process-Time&quot;
     that contains the time it took for this function to run. This is useful for debugging purposes.
+    The same measurement feeds the per-route latency histogram and status code counter of /metrics.
+    It also counts the SQL statements of the request and the time spent on them. Requests over the
+    REQUEST_QUERY_LIMIT / REQUEST_DB_TIME_MS thresholds are logged with their most repeated statements.
+    With DEBUG_QUERY_HEADERS on, the numbers are also sent as response headers.
 
     :param request: Request: Access the request object
     :param call_next: Call the next middleware in the chain
     :return: A response object with an additional header
     """
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
+    in_progress = IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+    start_time = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    with count_queries() as stats:
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            process_time = time.perf_counter() - start_time
+            in_progress.dec()
+            route = route_label(request)
+            REQUEST_LATENCY.labels(request.method, route).observe(process_time)
+            REQUESTS.labels(request.method, route, str(status_code)).inc()
+            report_request(stats, request.method, route)
     response.headers["My-Process-Time"] = str(process_time)
+    if DEBUG_QUERY_HEADERS:
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+        response.headers["X-DB-Time"] = f"{stats.duration:.6f}"
     return response
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    The metrics function exposes the metrics of this worker in the Prometheus text format.
+
+    :return: A plain text response
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/", name='Home')
 def read_root():
     """
@@ -69,21 +119,22 @@ def read_root():
 
 
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     """
     The healthchecker function is a simple endpoint that can be used to verify the API is up and running.
-    It also verifies that the database connection has been established successfully.
+    It also verifies that the database connection has been established successfully
+    and reports how busy the connection pool of this worker is.
 
-    :param db: Session: Pass in the database session object
-    :return: A dict with a message key
+    :param db: AsyncSession: Pass in the database session object
+    :return: A dict with a message and a pool key
     """
     try:
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         print(result)
         if result is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail=DB_CONFIG_ERROR)
-        return {"message": WELCOME_MESSAGE}
+        return {"message": WELCOME_MESSAGE, "pool": pool_status(async_engine)}
     except Exception as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,59 @@
+"""initial schema
+
+The users and contacts tables as the first release of the models created them with Base.metadata.create_all.
+Databases created that way are brought under migrations with: alembic stamp 3f1c2a9b7d10
+
+Revision ID: 3f1c2a9b7d10
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=True),
+        sa.Column('email', sa.String(length=250), nullable=False),
+        sa.Column('password', sa.String(length=255), nullable=False),
+        sa.Column('avatar', sa.String(length=255), nullable=True),
+        sa.Column('refresh_token', sa.String(length=255), nullable=True),
+        sa.Column('confirmed', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_table(
+        'contacts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('surname', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('phone', sa.String(), nullable=False),
+        sa.Column('birthday', sa.DateTime(), nullable=False),
+        sa.Column('additionally', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_contacts_id', 'contacts', ['id'])
+    op.create_index('ix_contacts_name', 'contacts', ['name'])
+    op.create_index('ix_contacts_surname', 'contacts', ['surname'])
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
+    op.create_index('ix_contacts_phone', 'contacts', ['phone'], unique=True)
+    op.create_index('ix_contacts_birthday', 'contacts', ['birthday'])
+    op.create_index('ix_contacts_additionally', 'contacts', ['additionally'])
+
+
+def downgrade() -> None:
+    op.drop_table('contacts')
+    op.drop_table('users')
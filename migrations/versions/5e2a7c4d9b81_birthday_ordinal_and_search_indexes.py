@@ -0,0 +1,72 @@
+"""birthday ordinal and search indexes
+
+Adds the birthday_ordinal column the birthday list is matched on, generated by the database from birthday
+(month * 100 + day), so existing rows get it as soon as it is added. Adds the search indexes: pg_trgm GIN indexes
+on PostgreSQL, and on SQLite an external-content FTS5 table with the triggers that keep it in sync, rebuilt from
+the existing contacts.
+
+Revision ID: 5e2a7c4d9b81
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-17 09:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2a7c4d9b81'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+TRGM_COLUMNS = ('name', 'surname', 'email')
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "name, surname, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, name, surname, email) VALUES (new.id, new.name, new.surname, new.email); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, name, surname, email) "
+    "VALUES ('delete', old.id, old.name, old.surname, old.email); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, name, surname, email) "
+    "VALUES ('delete', old.id, old.name, old.surname, old.email); "
+    "INSERT INTO contacts_fts(rowid, name, surname, email) VALUES (new.id, new.name, new.surname, new.email); "
+    "END",
+    # Index the rows the table already has
+    "INSERT INTO contacts_fts(contacts_fts) VALUES('rebuild')",
+)
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    birthday = sa.column('birthday')
+    op.add_column('contacts', sa.Column(
+        'birthday_ordinal', sa.Integer(),
+        sa.Computed(sa.cast(sa.extract('month', birthday) * 100 + sa.extract('day', birthday), sa.Integer)),
+    ))
+    op.create_index('ix_contacts_user_id_birthday_ordinal', 'contacts', ['user_id', 'birthday_ordinal'])
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in TRGM_COLUMNS:
+            op.create_index(f'ix_contacts_{column}_trgm', 'contacts', [column], postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        for statement in FTS_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for column in TRGM_COLUMNS:
+            op.drop_index(f'ix_contacts_{column}_trgm', table_name='contacts')
+    elif dialect == 'sqlite':
+        for trigger in ('contacts_fts_ai', 'contacts_fts_ad', 'contacts_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS contacts_fts')
+    op.drop_index('ix_contacts_user_id_birthday_ordinal', table_name='contacts')
+    op.drop_column('contacts', 'birthday_ordinal')
@@ -0,0 +1,57 @@
+"""per-user contact indexes
+
+Replaces the single-column contact indexes with composite indexes that lead with user_id, the filter of every
+contact query. The primary key, name, surname, birthday and additionally indexes are dropped: nothing filters
+or sorts on those columns alone, and search has its own trigram / FTS5 indexes. The unique email and phone
+indexes stay. On PostgreSQL the indexes are built and dropped CONCURRENTLY, so writes are not blocked.
+
+Revision ID: 8b4e6d2f1a53
+Revises: 5e2a7c4d9b81
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d2f1a53'
+down_revision = '5e2a7c4d9b81'
+branch_labels = None
+depends_on = None
+
+NEW_INDEXES = {
+    'ix_contacts_user_id_id': ['user_id', 'id'],
+    'ix_contacts_user_id_surname_name': ['user_id', 'surname', 'name'],
+    'ix_contacts_user_id_birthday_ordinal_id': ['user_id', 'birthday_ordinal', 'id'],
+}
+OLD_INDEXES = {
+    'ix_contacts_id': ['id'],
+    'ix_contacts_name': ['name'],
+    'ix_contacts_surname': ['surname'],
+    'ix_contacts_birthday': ['birthday'],
+    'ix_contacts_additionally': ['additionally'],
+    'ix_contacts_user_id_birthday_ordinal': ['user_id', 'birthday_ordinal'],
+}
+
+
+def _swap(create: dict[str, list[str]], drop: dict[str, list[str]]) -> None:
+    # New indexes first, so the queries always have one to use
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, columns in create.items():
+                op.create_index(name, 'contacts', columns, postgresql_concurrently=True)
+            for name in drop:
+                op.drop_index(name, table_name='contacts', postgresql_concurrently=True)
+    else:
+        for name, columns in create.items():
+            op.create_index(name, 'contacts', columns)
+        for name in drop:
+            op.drop_index(name, table_name='contacts')
+
+
+def upgrade() -> None:
+    _swap(NEW_INDEXES, OLD_INDEXES)
+
+
+def downgrade() -> None:
+    _swap(OLD_INDEXES, NEW_INDEXES)
@@ -2,9 +2,12 @@ import os
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from src.conf.config import settings
+from src.database.pool_metrics import MeteredAsyncQueuePool
 
 load_dotenv()
 
@@ -14,22 +17,69 @@ password_db = os.environ.get('password_db')
 host = os.environ.get('host')
 name_app = os.environ.get('name_app')
 
+# Pool sizing is per worker process: pool_size + max_overflow connections at most
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str | URL) -> URL:
+    """
+    The to_async_url function swaps the driver of a database url for its asyncio counterpart.
+        postgresql+psycopg2://... becomes postgresql+asyncpg://... and sqlite://... becomes sqlite+aiosqlite://...
+        Urls that already use an async driver, or a backend we don't know, are returned unchanged.
+
+    :param url: str | URL: The database url from the settings
+    :return: A url that can be passed to create_async_engine
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS and url.drivername != ASYNC_DRIVERS[backend]:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url
+
+
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
+ASYNC_SQLALCHEMY_DATABASE_URL = to_async_url(SQLALCHEMY_DATABASE_URL)
 
+# Sync engine is kept for scripts (seed, migrations) that run outside the event loop
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def pool_options(url: URL) -> dict:
+    """
+    The pool_options function returns the pool arguments for create_async_engine.
+        SQLite keeps the pool SQLAlchemy picks for it, every other backend gets a sized,
+        metered queue pool with pre-ping and recycling.
+
+    :param url: URL: The database url
+    :return: Keyword arguments for create_async_engine
+    """
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {"poolclass": MeteredAsyncQueuePool, "pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT, "pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": DB_POOL_PRE_PING}
+
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **pool_options(ASYNC_SQLALCHEMY_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+
 # Dependency
-def get_db():
+async def get_db():
     """
-    The get_db function is a context manager that returns the database session.
+    The get_db function is a dependency that returns an asynchronous database session.
     It also ensures that the connection to the database is closed after each request.
 
-    :return: A database session
+    :return: An AsyncSession
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
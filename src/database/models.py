@@ -1,8 +1,22 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Computed, DDL, Index, cast, event, \
+    extract
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
+
+def birthday_ordinal(birthday) -> int:
+    """
+    The birthday_ordinal function turns a birthday into a sortable month-day number, e.g. 14 March -> 314.
+    Unlike the day of the year it does not depend on the year, so 29 February is always 229.
+    The database generates the contacts.birthday_ordinal column with the same formula.
+
+    :param birthday: date | datetime: The birthday to convert
+    :return: month * 100 + day
+    """
+    return birthday.month * 100 + birthday.day
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -16,12 +30,57 @@ class User(Base):
 
 class Contact(Base):
     __tablename__ = "contacts"
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
-    surname = Column(String, index=True, nullable=False)
+    # Every query is scoped to one user, so the B-tree indexes lead with user_id and follow with the order the
+    # rows are read in. Search uses its own indexes (trigram GIN on Postgres, FTS5 on SQLite), email and phone
+    # are only indexed to be unique. Changes here need a migration in migrations/versions.
+    __table_args__ = (
+        Index('ix_contacts_name_trgm', 'name', postgresql_using='gin',
+              postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_surname_trgm', 'surname', postgresql_using='gin',
+              postgresql_ops={'surname': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_email_trgm', 'email', postgresql_using='gin',
+              postgresql_ops={'email': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_user_id_surname_name', 'user_id', 'surname', 'name'),
+        Index('ix_contacts_user_id_birthday_ordinal_id', 'user_id', 'birthday_ordinal', 'id'),
+    )
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    surname = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     phone = Column(String, unique=True, index=True, nullable=False)
-    birthday = Column(DateTime, index=True, nullable=False)
-    additionally = Column(String, index=True, nullable=True)
+    birthday = Column(DateTime, nullable=False)
+    # Generated by the database from birthday (VIRTUAL on SQLite, STORED on Postgres), so it can't go stale
+    birthday_ordinal = Column(Integer, Computed(cast(extract('month', birthday) * 100 + extract('day', birthday),
+                                                     Integer)))
+    additionally = Column(String, nullable=True)
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user = relationship('User', backref="contacts")
+
+
+# Search indexes: pg_trgm GIN indexes on Postgres, an external-content FTS5 table kept in sync by triggers on SQLite
+CONTACTS_FTS = 'contacts_fts'
+
+event.listen(Contact.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+for statement in (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {CONTACTS_FTS} USING fts5("
+    "name, surname, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    f"INSERT INTO {CONTACTS_FTS}(rowid, name, surname, email) VALUES (new.id, new.name, new.surname, new.email); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    f"INSERT INTO {CONTACTS_FTS}({CONTACTS_FTS}, rowid, name, surname, email) "
+    "VALUES ('delete', old.id, old.name, old.surname, old.email); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    f"INSERT INTO {CONTACTS_FTS}({CONTACTS_FTS}, rowid, name, surname, email) "
+    "VALUES ('delete', old.id, old.name, old.surname, old.email); "
+    f"INSERT INTO {CONTACTS_FTS}(rowid, name, surname, email) VALUES (new.id, new.name, new.surname, new.email); "
+    "END",
+):
+    event.listen(Contact.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+event.listen(Contact.__table__, 'before_drop',
+             DDL(f'DROP TABLE IF EXISTS {CONTACTS_FTS}').execute_if(dialect='sqlite'))
@@ -0,0 +1,71 @@
+import logging
+import os
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+POOL_WAIT_WARNING = float(os.environ.get('DB_POOL_WAIT_WARNING_MS', 100)) / 1000
+
+
+class PoolMetrics:
+    """
+    Counters for connection checkouts of the async engine pool: how many, how long callers waited
+    for a connection and how many gave up with the QueuePool limit timeout.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def reset(self) -> None:
+        self.__init__()
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredAsyncQueuePool(AsyncAdaptedQueuePool):
+    """An AsyncAdaptedQueuePool that records checkout waits and timeouts in pool_metrics."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            logger.error("Connection pool exhausted: %s", self.status())
+            raise
+        waited = time.perf_counter() - start
+        pool_metrics.observe(waited)
+        if waited > POOL_WAIT_WARNING:
+            logger.warning("Waited %.0f ms for a database connection: %s", waited * 1000, self.status())
+        return connection
+
+
+def pool_status(engine) -> dict:
+    """
+    The pool_status function reports how busy the connection pool of an engine is.
+
+    :param engine: Engine | AsyncEngine: The engine whose pool to inspect
+    :return: A dict with the pool gauges and the checkout counters
+    """
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                      overflow=pool.overflow(), max_overflow=getattr(pool, "_max_overflow", None))
+    checkouts = pool_metrics.checkouts
+    status.update(checkouts=checkouts, timeouts=pool_metrics.timeouts,
+                  wait_avg_ms=round(pool_metrics.wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                  wait_max_ms=round(pool_metrics.wait_max * 1000, 3))
+    return status
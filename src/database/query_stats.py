@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from src.services.metrics import DB_QUERY_LATENCY
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY = float(os.environ.get('SLOW_QUERY_MS', 200)) / 1000
+REQUEST_QUERY_LIMIT = int(os.environ.get('REQUEST_QUERY_LIMIT', 20))
+REQUEST_DB_TIME_LIMIT = float(os.environ.get('REQUEST_DB_TIME_MS', 500)) / 1000
+DEBUG_QUERY_HEADERS = os.environ.get('DEBUG_QUERY_HEADERS', 'false').lower() in ('1', 'true', 'yes')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\$\d+|(?<!:):\w+|%\(\w+\)s|\?")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    The fingerprint function normalizes a SQL statement so that executions that differ only
+    in their parameters, literals or IN-list length are grouped together.
+
+    :param statement: str: The SQL as sent to the driver
+    :return: The normalized statement
+    """
+    statement = _SPACES.sub(" ", statement).strip()
+    statement = _LITERALS.sub("?", statement)
+    return _LISTS.sub("(...)", statement)
+
+
+def fingerprint_id(statement: str) -> str:
+    return hashlib.sha1(fingerprint(statement).encode()).hexdigest()[:12]
+
+
+class QueryStats:
+    """The number of statements and database time spent while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar("current_query_stats", default=None)
+
+
+@contextmanager
+def count_queries():
+    """
+    The count_queries function collects the statements run inside the with block, in this task and the
+    tasks it starts. The middleware wraps every request with it; tests can use it to pin query counts.
+
+    :return: A QueryStats filled in as statements run
+    """
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+def track_queries(engine) -> None:
+    """
+    The track_queries function adds the event hooks that time every statement once and feed the measurement
+    to count_queries, the db_query_duration_seconds histogram and the slow query log.
+
+    :param engine: Engine | AsyncEngine: The engine to track
+    :return: None
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_stats_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_stats_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_LATENCY.labels(operation).observe(duration)
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.record(statement, duration)
+        if duration > SLOW_QUERY:
+            logger.warning("Slow query %.0f ms [%s]: %s", duration * 1000, fingerprint_id(statement),
+                           fingerprint(statement))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_stats_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+def report_request(stats: QueryStats, method: str, route: str) -> None:
+    """
+    The report_request function logs a request that ran too many statements or spent too long in the database,
+    with the most repeated statements first, which is where N+1 patterns show up.
+
+    :param stats: QueryStats: The statements of the request
+    :param method: str: The HTTP method
+    :param route: str: The route template
+    :return: None
+    """
+    if stats.count > REQUEST_QUERY_LIMIT or stats.duration > REQUEST_DB_TIME_LIMIT:
+        top = "; ".join(f"{count}x [{fingerprint_id(statement)}] {statement}"
+                        for statement, count in stats.fingerprints.most_common(3))
+        logger.warning("%s %s ran %d queries in %.0f ms: %s", method, route, stats.count, stats.duration * 1000,
+                       top)
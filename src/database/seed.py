@@ -1,50 +1,225 @@
-from random import randint
+"""
+Fill the database with fake users and contacts.
+
+    python -m src.database.seed [--contacts N] [--users N] [--batch-size N] [--seed N] [--workers N] [--reset]
+
+Contacts are generated in batches from name pools drawn once with Faker, so a batch only costs a few
+random choices per row, and batches are generated in a process pool while the previous one is inserted.
+Rows go in with COPY on PostgreSQL and an executemany INSERT elsewhere. The non-unique contact indexes
+and, on SQLite, the full-text search triggers are dropped for the load and rebuilt once at the end.
+The same --seed always produces the same data; emails and phones embed it, so seeding again without
+--reset needs another seed.
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+from functools import lru_cache
 
 from faker import Faker
-from sqlalchemy.orm import Session
+from sqlalchemy import Connection, Engine, Table, insert, text
 
-from src.database.connect import SessionLocal
-from src.database.models import Contact, User
-from src.schemas import ContactModel, UserModel
+from src.database.connect import engine as default_engine
+from src.database.models import Base, Contact, User, CONTACTS_FTS
+from src.services.passwords import make_pwd_context
 
-fake = Faker()
-database = SessionLocal()
+POOL_SIZE = 1000
+BIRTHDAY_EPOCH = date(1950, 1, 1)
+BIRTHDAY_SPAN = 365 * 55
 
 
-def create_contacts(body: ContactModel, db: Session = database):
-    contact = Contact(**body.dict())
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
-    return contact
+@lru_cache(maxsize=4)
+def name_pools(seed: int) -> tuple[list[str], list[str], list[str]]:
+    """
+    The name_pools function draws the first names, surnames and sentences contacts are assembled from.
 
+    :param seed: int: Seed of the Faker instance
+    :return: First names, surnames and short sentences
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    return ([fake.first_name() for _ in range(POOL_SIZE)],
+            [fake.last_name() for _ in range(POOL_SIZE)],
+            [fake.sentence(nb_words=6) for _ in range(POOL_SIZE)])
 
-def create_users(body: UserModel, db: Session = database):
-    user = User(**body.dict())
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
 
+def generate_users(count: int, seed: int, password_hash: str) -> list[dict]:
+    """
+    The generate_users function builds the rows of count confirmed users that share one password hash.
+
+    :param count: int: How many users to build
+    :param seed: int: Seed of the random data
+    :param password_hash: str: Hash stored for every user
+    :return: A list of dicts ready for an INSERT
+    """
+    names, _, _ = name_pools(seed)
+    rng = random.Random(f"users:{seed}")
+    return [{"username": name, "email": f"{name.lower()}.{seed}.{number}@example.com", "password": password_hash,
+             "confirmed": True} for number, name in enumerate(rng.choices(names, k=count))]
+
+
+def generate_contacts(start: int, stop: int, user_ids: list[int], seed: int) -> list[dict]:
+    """
+    The generate_contacts function builds the contacts numbered start..stop-1.
+        Contact n belongs to user_ids[n % len(user_ids)]. The output only depends on the arguments,
+        so batches can be generated in any order and in other processes.
+
+    :param start: int: Number of the first contact
+    :param stop: int: Number after the last contact
+    :param user_ids: list[int]: Owners the contacts are spread over
+    :param seed: int: Seed of the random data
+    :return: A list of dicts ready for an INSERT
+    """
+    names, surnames, sentences = name_pools(seed)
+    rng = random.Random(f"contacts:{seed}:{start}")
+    count = stop - start
+    firsts = rng.choices(names, k=count)
+    lasts = rng.choices(surnames, k=count)
+    notes = rng.choices(sentences, k=count)
+    offsets = rng.choices(range(BIRTHDAY_SPAN), k=count)
+    owners = len(user_ids)
+    rows = []
+    for number, name, surname, note, offset in zip(range(start, stop), firsts, lasts, notes, offsets):
+        birthday = BIRTHDAY_EPOCH + timedelta(days=offset)
+        rows.append({"name": name, "surname": surname,
+                     "email": f"{name}.{surname}.{seed}.{number}@example.com".lower(),
+                     "phone": f"+{seed % 100:02d}{number:010d}", "birthday": birthday,
+                     "additionally": note,
+                     "user_id": user_ids[number % owners]})
+    return rows
+
+
+def _generate_batch(task: tuple[int, int, list[int], int]) -> list[dict]:
+    return generate_contacts(*task)
+
+
+def insert_rows(connection: Connection, table: Table, rows: list[dict]) -> None:
+    """
+    The insert_rows function writes rows to table in one round trip: COPY on PostgreSQL,
+    an executemany INSERT on every other backend.
+
+    :param connection: Connection: Connection with an open transaction
+    :param table: Table: Target table
+    :param rows: list[dict]: Rows with the same keys
+    :return: None
+    """
+    if not rows:
+        return
+    if connection.dialect.name != "postgresql":
+        connection.execute(insert(table), rows)
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
 
-if __name__ == '__main__':
 
-    for _ in range(10):
-        random_user = UserModel(
-            username=fake.first_name(),
-            email=fake.email(),
-            password=fake.password()
-        )
-        create_users(body=random_user, db=database)
-
-    for _ in range(100):
-        random_contact = ContactModel(
-            name=fake.first_name(),
-            surname=fake.last_name(),
-            email=fake.email(),
-            phone=fake.msisdn(),
-            birthday=fake.date(),
-            additionally=fake.paragraph(nb_sentences=2),
-            user_id=randint(1, 10)
-        )
-        create_contacts(body=random_contact, db=database)
+@contextmanager
+def bulk_load(connection: Connection):
+    """
+    The bulk_load function suspends the contact index maintenance for the duration of the block.
+        The non-unique indexes are dropped and created again afterwards, which is one sorted build instead
+        of a million single-row updates. On SQLite the search triggers are dropped too, and the
+        full-text table is rebuilt from the contacts table at the end.
+
+    :param connection: Connection: Connection with an open transaction
+    :return: A context manager
+    """
+    table = Contact.__table__
+    indexes = [index for index in table.indexes if not index.unique]
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    triggers = []
+    if connection.dialect.name == "sqlite":
+        triggers = connection.execute(text("SELECT name, sql FROM sqlite_master "
+                                           "WHERE type = 'trigger' AND tbl_name = :table"),
+                                      {"table": table.name}).all()
+        for name, _ in triggers:
+            connection.execute(text(f"DROP TRIGGER {name}"))
+    yield
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+    if triggers:
+        connection.execute(text(f"INSERT INTO {CONTACTS_FTS}({CONTACTS_FTS}) VALUES ('rebuild')"))
+        for _, sql in triggers:
+            connection.execute(text(sql))
+
+
+def seed(engine: Engine, contacts: int, users: int, batch_size: int = 10000, seed: int = 0, workers: int = 1,
+         password: str = "password", reset: bool = False) -> list[int]:
+    """
+    The seed function inserts users and then contacts spread over them round-robin, in one transaction.
+
+    :param engine: Engine: The database to fill
+    :param contacts: int: How many contacts to insert
+    :param users: int: How many users to create
+    :param batch_size: int: Contacts per generated batch and per INSERT
+    :param seed: int: Seed of the random data
+    :param workers: int: Processes generating batches, 1 generates in this process
+    :param password: str: Password of every seeded user
+    :param reset: bool: Drop and create all tables first
+    :return: The ids of the new users
+    :raises ValueError: If there are no users to own the contacts or batch_size is not positive
+    """
+    if users < 1 or batch_size < 1:
+        raise ValueError("users and batch_size must be at least 1")
+    if reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    password_hash = make_pwd_context().hash(password)
+    with engine.begin() as connection:
+        result = connection.execute(insert(User.__table__).returning(User.id, sort_by_parameter_order=True),
+                                    generate_users(users, seed, password_hash))
+        user_ids = list(result.scalars().all())
+        tasks = [(start, min(start + batch_size, contacts), user_ids, seed)
+                 for start in range(0, contacts, batch_size)]
+        with bulk_load(connection):
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    for rows in executor.map(_generate_batch, tasks):
+                        insert_rows(connection, Contact.__table__, rows)
+            else:
+                for task in tasks:
+                    insert_rows(connection, Contact.__table__, _generate_batch(task))
+    return user_ids
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=100, help="contacts to create")
+    parser.add_argument("--users", type=positive_int, default=10, help="users the contacts are spread over")
+    parser.add_argument("--batch-size", type=positive_int, default=10000, help="contacts per batch")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random data")
+    parser.add_argument("--workers", type=positive_int, default=1, help="processes generating batches")
+    parser.add_argument("--password", default="password", help="password of every seeded user")
+    parser.add_argument("--reset", action="store_true", help="drop and create all tables first")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    seed(default_engine, args.contacts, args.users, batch_size=args.batch_size, seed=args.seed,
+         workers=args.workers, password=args.password, reset=args.reset)
+    elapsed = time.perf_counter() - start
+    print(f"Seeded {args.users} users and {args.contacts} contacts in {elapsed:.1f}s "
+          f"({args.contacts / elapsed:.0f} contacts/s)")
+
+
+if __name__ == '__main__':
+    main()
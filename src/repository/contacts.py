@@ -1,28 +1,91 @@
-from datetime import datetime, timedelta
+from calendar import isleap
+from datetime import date, timedelta
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import Date, and_, or_, select, insert, update, delete, text, column, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import Contact, User
-from src.schemas import ContactModel
+from src.database.models import Contact, User, CONTACTS_FTS, birthday_ordinal
+from src.schemas import ContactModel, ContactUpdateModel
 
+# The columns of ResponseContact, in its field order
+EXPORT_FIELDS = ('id', 'name', 'surname', 'email', 'phone', 'birthday', 'additionally')
+# birthday_ordinal of 29 February
+LEAP_DAY = 229
 
-async def get_contacts(user: User, db: Session):
+
+def _column(field: str):
+    if field == 'birthday':
+        # Stored as a DateTime but exposed as a date, the way ResponseContact validates it. date() truncates
+        # it in the query on both SQLite and Postgres
+        return func.date(Contact.birthday, type_=Date).label('birthday')
+    return getattr(Contact, field)
+
+
+def _columns(fields=EXPORT_FIELDS):
+    return [Contact.id] + [_column(field) for field in fields if field != 'id']
+
+
+async def get_contacts(user: User, db: AsyncSession, limit: int | None = None, after_id: int | None = None,
+                       fields: list[str] | None = None, rows: bool = False):
     """
     The get_contacts function returns a list of contacts for the user.
+        Contacts are ordered by id, so a page is continued with after_id (keyset pagination)
+        instead of an OFFSET that has to skip over all the previous rows.
         Args:
             user (User): The User object to get contacts for.
-            db (Session): A database session to use when querying the database.
+            db (AsyncSession): A database session to use when querying the database.
+            limit (int | None): The maximum number of contacts to return, all of them if None.
+            after_id (int | None): Only return contacts with a greater id.
+            fields (list[str] | None): Only select these columns and return dicts instead of Contact objects.
+            rows (bool): Return dicts of all the EXPORT_FIELDS columns instead of Contact objects.
 
     :param user: User: Get the user id from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
+    :param limit: int | None: Limit the size of the page
+    :param after_id: int | None: The id of the last contact of the previous page
+    :param fields: list[str] | None: Select only these columns, the id is always included
+    :param rows: bool: Return plain dicts, as with fields, of all the EXPORT_FIELDS
     :return: A list of contacts for the specified user
     """
-    contacts = db.query(Contact).filter(and_(Contact.user_id == user.id)).all()
+    if fields or rows:
+        stmt = select(*_columns(fields or EXPORT_FIELDS))
+    else:
+        stmt = select(Contact)
+    stmt = stmt.filter(and_(Contact.user_id == user.id))
+    if after_id is not None:
+        stmt = stmt.filter(Contact.id > after_id)
+    stmt = stmt.order_by(Contact.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    if fields or rows:
+        return [dict(row) for row in result.mappings().all()]
+    contacts = result.scalars().all()
     return contacts
 
 
-async def get_contact(contact_id: int, user: User, db: Session):
+async def stream_contacts(user: User, db: AsyncSession, batch_size: int = 1000):
+    """
+    The stream_contacts function yields all contacts of the user in batches of plain dicts.
+        Rows are read through a server-side cursor (stream_results/yield_per), and only the
+        exported columns are selected, so memory use does not grow with the size of the contact book.
+
+    :param user: User: Get the contacts of this user
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: How many rows are fetched from the cursor at a time
+    :return: An async generator of lists of dicts
+    """
+    stmt = select(*_columns()) \
+        .filter(Contact.user_id == user.id) \
+        .order_by(Contact.id) \
+        .execution_options(yield_per=batch_size)
+    result = await db.stream(stmt)
+    async for partition in result.mappings().partitions():
+        yield [dict(row) for row in partition]
+
+
+async def get_contact(contact_id: int, user: User, db: AsyncSession):
     """
     The get_contact function takes in a contact_id and user, and returns the contact with that id.
         Args:
@@ -31,30 +94,89 @@ async def get_contact(contact_id: int, user: User, db: Session):
 
     :param contact_id: int: Specify the id of the contact to be returned
     :param user: User: Get the user's id from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    result = await db.execute(select(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)))
+    contact = result.scalars().first()
     return contact
 
 
-async def create_contact(body: ContactModel, user: User, db: Session):
+async def create_contact(body: ContactModel, user: User, db: AsyncSession):
     """
     The create_contact function creates a new contact in the database.
 
     :param body: ContactModel: Validate the request body
     :param user: User: Get the user id from the token
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A contact object
     """
     contact = Contact(**body.dict(), user_id=user.id)
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
     return contact
 
 
-async def update_contact(body: ContactModel, contact_id: int, user: User, db: Session):
+async def create_contacts(bodies: list[ContactModel], user: User, db: AsyncSession) -> list[int | str | None]:
+    """
+    The create_contacts function inserts a chunk of contacts in a single transaction.
+        Rows whose email or phone is already taken, in the database or earlier in the same chunk,
+        are skipped instead of failing the whole chunk. The rest go in with one executemany INSERT.
+        If a concurrent insert still trips a unique constraint, the chunk is retried row by row
+        with savepoints, so only the conflicting rows are lost.
+
+    :param bodies: list[ContactModel]: The validated contacts to insert
+    :param user: User: Get the user id from the token
+    :param db: AsyncSession: Access the database
+    :return: For each body the new contact id, the name of the conflicting field or None for an unknown conflict
+    """
+    outcome: list[int | str | None] = [None] * len(bodies)
+    emails = {body.email for body in bodies}
+    phones = {body.phone for body in bodies}
+    result = await db.execute(select(Contact.email, Contact.phone)
+                              .filter(or_(Contact.email.in_(emails), Contact.phone.in_(phones))))
+    taken_emails, taken_phones = set(), set()
+    for email, phone in result.all():
+        taken_emails.add(email)
+        taken_phones.add(phone)
+
+    rows, positions = [], []
+    for position, body in enumerate(bodies):
+        if body.email in taken_emails:
+            outcome[position] = 'email'
+            continue
+        if body.phone in taken_phones:
+            outcome[position] = 'phone'
+            continue
+        taken_emails.add(body.email)
+        taken_phones.add(body.phone)
+        rows.append({**body.dict(), 'user_id': user.id})
+        positions.append(position)
+    if not rows:
+        return outcome
+
+    stmt = insert(Contact).returning(Contact.id, sort_by_parameter_order=True)
+    try:
+        result = await db.execute(stmt, rows)
+        ids = list(result.scalars().all())
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        ids = []
+        for row in rows:
+            try:
+                async with db.begin_nested():
+                    result = await db.execute(stmt, [row])
+                    ids.append(result.scalar_one())
+            except IntegrityError:
+                ids.append(None)
+        await db.commit()
+    for position, new_id in zip(positions, ids):
+        outcome[position] = new_id
+    return outcome
+
+
+async def update_contact(body: ContactModel, contact_id: int, user: User, db: AsyncSession):
     """
     The update_contact function updates a contact in the database.
         Args:
@@ -65,24 +187,61 @@ async def update_contact(body: ContactModel, contact_id: int, user: User, db: Se
     :param body: ContactModel: Get the data from the request body
     :param contact_id: int: Specify the contact to be deleted
     :param user: User: Get the user id from the token
-    :param db: Session: Get access to the database
+    :param db: AsyncSession: Get access to the database
     :return: A contact
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.name = body.name
-        contact.surname = body.surname
-        contact.email = body.email
-        contact.phone = body.phone
-        contact.birthday = body.birthday
-        contact.additionally = body.additionally
-        db.commit()
+    return await _update_contact(body.dict(), contact_id, user, db)
+
+
+async def patch_contact(body: ContactUpdateModel, contact_id: int, user: User, db: AsyncSession):
+    """
+    The patch_contact function updates only the fields that are present in the request body.
+
+    :param body: ContactUpdateModel: The fields to change
+    :param contact_id: int: Specify the contact to be updated
+    :param user: User: Get the user id from the token
+    :param db: AsyncSession: Get access to the database
+    :return: The updated contact, or None if the user has no such contact
+    """
+    values = body.dict(exclude_unset=True)
+    if not values:
+        return await get_contact(contact_id, user, db)
+    return await _update_contact(values, contact_id, user, db)
+
+
+async def _update_contact(values: dict, contact_id: int, user: User, db: AsyncSession):
+    """
+    The _update_contact function writes values to a contact of the user in a single
+    UPDATE ... WHERE id = ? AND user_id = ? RETURNING statement. Backends without UPDATE ... RETURNING
+    load the contact first and update it through the ORM.
+
+    :param values: dict: Column values to set
+    :param contact_id: int: Specify the contact to be updated
+    :param user: User: Get the user id from the token
+    :param db: AsyncSession: Get access to the database
+    :return: The updated contact, or None if the user has no such contact
+    """
+    if not db.get_bind().dialect.update_returning:
+        contact = await get_contact(contact_id, user, db)
+        if contact:
+            for key, value in values.items():
+                setattr(contact, key, value)
+            await db.commit()
+        return contact
+    stmt = update(Contact) \
+        .where(and_(Contact.id == contact_id, Contact.user_id == user.id)) \
+        .values(**values) \
+        .returning(Contact)
+    result = await db.execute(stmt)
+    contact = result.scalars().first()
+    await db.commit()
     return contact
 
 
-async def remove_contact(contact_id: int, user: User, db: Session):
+async def remove_contact(contact_id: int, user: User, db: AsyncSession):
     """
     The remove_contact function removes a contact from the database.
+        It is a single DELETE ... RETURNING statement where the backend supports it.
         Args:
             contact_id (int): The id of the contact to be removed.
             user (User): The user who is removing the contact. This is used to ensure that only contacts belonging to this
@@ -90,55 +249,97 @@ async def remove_contact(contact_id: int, user: User, db: Session):
 
     :param contact_id: int: Specify the id of the contact that is to be removed
     :param user: User: Get the user's id from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object if the contact is found and deleted
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        db.delete(contact)
-        db.commit()
+    if not db.get_bind().dialect.delete_returning:
+        contact = await get_contact(contact_id, user, db)
+        if contact:
+            await db.delete(contact)
+            await db.commit()
+        return contact
+    stmt = delete(Contact).where(and_(Contact.id == contact_id, Contact.user_id == user.id)).returning(Contact)
+    result = await db.execute(stmt)
+    contact = result.scalars().first()
+    await db.commit()
     return contact
 
 
-async def birthday_list(db: Session):
+def _has_common_feb_28(first: date, last: date) -> bool:
+    """
+    The _has_common_feb_28 function tells whether the days from first to last include 28 February of a year
+    without a 29th, the day 29 February birthdays are celebrated on in such a year.
+
+    :param first: date: The first day of the window
+    :param last: date: The last day of the window, less than a year after first
+    :return: True if 29 February birthdays fall in the window
+    """
+    return any(not isleap(year) and first <= first.replace(year=year, month=2, day=28) <= last
+               for year in {first.year, last.year})
+
+
+async def birthday_list(user: User, db: AsyncSession, days: int = 7, rows: bool = False):
     """
-    The birthday_list function returns a list of contacts whose birthday is within the next 7 days.
-        The function takes in a database session and queries all contacts from the database.
-        It then iterates through each contact, replacing their birth year with the current year,
-        and subtracting that date from today's date to get a timedelta object. If that timedelta object
-        is between -7 days and 0 days (i.e., if it's less than 7 days away), we add it to our list of upcoming birthdays.
+    The birthday_list function returns a list of the user's contacts whose birthday is within the next few days.
+        The window is days long and starts today, so the default is today and the 6 days after it.
+        It is matched against the generated birthday_ordinal column (month * 100 + day), so the query
+        is a range scan over the (user_id, birthday_ordinal, id) index. When the window crosses the new year
+        the range wraps around: December birthdays are matched from the start ordinal, January ones up to the end.
+        In a year without 29 February, birthdays on that day are celebrated on 28 February.
 
-    :param db: Session: Pass the database session to the function
-    :return: A list of contacts whose birthday is in the next 7 days
+    :param user: User: Limit the list to the contacts of this user
+    :param db: AsyncSession: Pass the database session to the function
+    :param days: int: How many days to look at, today included; 0 returns no contacts
+    :param rows: bool: Return dicts of the EXPORT_FIELDS columns instead of Contact objects
+    :return: A list of contacts whose birthday is in the next days
     """
-    contacts_list = []
-    dt_now = datetime.now()
-    now_year = datetime.now().strftime('%Y')
-    contacts_all = db.query(Contact).all()
-    for contact in contacts_all:
-        delta = contact.birthday.replace(year=int(now_year)) - dt_now
-        if timedelta(days=-1) < delta < timedelta(days=7):
-            contacts_list.append(contact)
-    return contacts_list
+    if days <= 0:
+        return []
+    stmt = select(*_columns()) if rows else select(Contact)
+    stmt = stmt.filter(Contact.user_id == user.id)
+    if days < 366:
+        first = date.today()
+        last = first + timedelta(days=days - 1)
+        start, end = birthday_ordinal(first), birthday_ordinal(last)
+        if start <= end:
+            window = Contact.birthday_ordinal.between(start, end)
+        else:
+            window = or_(Contact.birthday_ordinal >= start, Contact.birthday_ordinal <= end)
+        if _has_common_feb_28(first, last):
+            window = or_(window, Contact.birthday_ordinal == LEAP_DAY)
+        stmt = stmt.filter(window)
+    result = await db.execute(stmt.order_by(Contact.birthday_ordinal, Contact.id))
+    if rows:
+        return [dict(row) for row in result.mappings().all()]
+    return result.scalars().all()
 
 
-async def searcher(part_to_search: str, db: Session):
+async def searcher(part_to_search: str, user: User, db: AsyncSession, rows: bool = False):
     """
-    The searcher function takes a string and a database session as arguments.
-    It then searches the database for contacts that have the string in their name, surname or email.
-    The function returns a list of all contacts found.
+    The searcher function takes a string, the current user and a database session as arguments.
+    It then searches the user's contacts that have the string in their name, surname or email.
+    The match is case-insensitive and runs in the database: on SQLite it goes through the contacts_fts
+    trigram table, everywhere else through ILIKE, which Postgres serves from the pg_trgm GIN indexes.
 
     :param part_to_search: str: Search for a contact in the database
-    :param db: Session: Pass the database session to the function
+    :param user: User: Limit the search to the contacts of this user
+    :param db: AsyncSession: Pass the database session to the function
+    :param rows: bool: Return dicts of the EXPORT_FIELDS columns instead of Contact objects
     :return: A list of contacts that match the search criteria
     """
-    contact_list = []
-    contacts_all = db.query(Contact).all()
-    for contact in contacts_all:
-        if part_to_search.capitalize() in contact.name.capitalize() and contact not in contact_list:
-            contact_list.append(contact)
-        if part_to_search.capitalize() in contact.surname.capitalize() and contact not in contact_list:
-            contact_list.append(contact)
-        if part_to_search.capitalize() in contact.email.capitalize() and contact not in contact_list:
-            contact_list.append(contact)
-    return contact_list
+    stmt = select(*_columns()) if rows else select(Contact)
+    stmt = stmt.filter(Contact.user_id == user.id)
+    if db.get_bind().dialect.name == 'sqlite' and len(part_to_search) >= 3:
+        # The trigram tokenizer needs at least three characters to use the index
+        phrase = '"' + part_to_search.replace('"', '""') + '"'
+        matches = text(f"SELECT rowid FROM {CONTACTS_FTS} WHERE {CONTACTS_FTS} MATCH :phrase")
+        stmt = stmt.filter(Contact.id.in_(matches.bindparams(phrase=phrase).columns(column('rowid'))))
+    else:
+        pattern = '%' + part_to_search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        stmt = stmt.filter(or_(Contact.name.ilike(pattern, escape='\\'),
+                               Contact.surname.ilike(pattern, escape='\\'),
+                               Contact.email.ilike(pattern, escape='\\')))
+    result = await db.execute(stmt.order_by(Contact.id))
+    if rows:
+        return [dict(row) for row in result.mappings().all()]
+    return result.scalars().all()
@@ -1,54 +1,65 @@
+import logging
 from secrets import compare_digest
 
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
+from src.database.models import User
 from src.repository import users as repository_users
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 from src.services.auth import auth_service
-from src.services.email import send_email
+from src.services.avatar import avatar_service
+from src.services.email import queue_confirmation_email
 from src.services.messages import ALREADY_EXISTS, SUCCESS_CREATE_USER, INVALID_EMAIL, EMAIL_NOT_CONFIRMED, \
     INVALID_PASSWORD, INVALID_TOKEN, VERIFICATION_ERROR, EMAIL_ALREADY_CONFIRMED, EMAIL_CONFIRMED, CHECK_YOUR_EMAIL
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes a UserModel object as input, which is validated by pydantic.
         If the email address already exists in the database, an HTTP 409 error is raised.
         The password field of the UserModel object is hashed using Argon2 and stored in that form.
         A new user record is created with this information and returned to the client.
+        The confirmation email, and the optional check of the Gravatar image, are left to the job worker.
+        If they can't be queued the user is still created, and can ask for the email again with request_email.
 
     :param body: UserModel: Get the data from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background queue
     :param request: Request: Get the base url of the application
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A dictionary with two keys: user and detail
     """
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=ALREADY_EXISTS)
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
+    try:
+        await queue_confirmation_email(new_user.email, new_user.username, request.base_url)
+        await avatar_service.schedule_verify(new_user.email)
+    except RedisError:
+        logger.exception("Could not queue the signup jobs of user %s", new_user.id)
     return {"user": new_user, "detail": SUCCESS_CREATE_USER}
 
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     The login function is used to authenticate a user.
         It takes in the username and password of the user, and returns an access token if successful.
         The access token can be used to make requests on behalf of that user.
+        A password stored with an outdated hash is rehashed with the current policy on a successful login.
 
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A dictionary with the access token, refresh token and token type
     """
     user = await repository_users.get_user_by_email(body.username, db)
@@ -56,23 +67,27 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_EMAIL)
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=EMAIL_NOT_CONFIRMED)
-    if not auth_service.verify_password(body.password, user.password):
+    valid, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_PASSWORD)
+    if new_hash is not None:
+        await repository_users.update_password(user, new_hash, db)
     access_token = await auth_service.create_access_token(data={"sub": user.email})
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
     await repository_users.update_token(user, refresh_token, db)
+    await auth_service.invalidate_user(user.email)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)):
     """
     The refresh_token function is used to refresh the access token.
     It takes in a refresh token and returns a new access_token,
     refresh_token pair. The old tokens are invalidated.
 
     :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: An access token and a refresh token
     """
     token = credentials.credentials
@@ -80,16 +95,32 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(sec
     user = await repository_users.get_user_by_email(email, db)
     if compare_digest(user.refresh_token, token):
         await repository_users.update_token(user, None, db)
+        await auth_service.invalidate_user(user.email)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_TOKEN)
 
     access_token = await auth_service.create_access_token(data={"sub": email})
     refresh_token = await auth_service.create_refresh_token(data={"sub": email})
     await repository_users.update_token(user, refresh_token, db)
+    await auth_service.invalidate_user(user.email)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(current_user: User = Depends(auth_service.get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    The logout function revokes the refresh token of the current user and drops the user from the auth caches.
+
+    :param current_user: User: Get the current user
+    :param db: AsyncSession: Get the database session
+    :return: None
+    """
+    user = await repository_users.get_user_by_email(current_user.email, db)
+    await repository_users.update_token(user, None, db)
+    await auth_service.invalidate_user(user.email)
+
+
 @router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     The confirmed_email function is used to confirm a user's email address.
         It takes the token from the URL and uses it to get the user's email address.
@@ -97,7 +128,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
         If not, then we update their record in our database with a confirmation of their email.
 
     :param token: str: Get the email from the token
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A message that the email has been confirmed
     """
     email = await auth_service.get_email_from_token(token)
@@ -107,12 +138,12 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
     if user.confirmed:
         return {"message": EMAIL_ALREADY_CONFIRMED}
     await repository_users.confirmed_email(email, db)
+    await auth_service.invalidate_user(email)
     return {"message": EMAIL_CONFIRMED}
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The request_email function is used to send an email to the user with a link that will allow them
     to confirm their account. The function takes in a RequestEmail object, which contains the email of
@@ -121,9 +152,8 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     If not, it sends an email containing a confirmation link.
 
     :param body: RequestEmail: Get the email from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base url of the application
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A message that depends on the user's email address
     """
     user = await repository_users.get_user_by_email(body.email, db)
@@ -131,5 +161,5 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": EMAIL_ALREADY_CONFIRMED}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        await queue_confirmation_email(user.email, user.username, request.base_url)
     return {"message": CHECK_YOUR_EMAIL}
@@ -1,57 +1,85 @@
-from typing import List
+from datetime import date
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query, Request
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.database.models import User
 from src.repository import contacts as repository_contacts
-from src.schemas import ContactModel, ResponseContact
+from src.schemas import ContactModel, ContactUpdateModel, ResponseContact, BulkResponse, BulkRowResult
 from src.services.auth import auth_service
-from src.services.messages import NOT_FOUND, TO_MANY_REQUESTS
+from src.services.bulk import BulkFormatError, ndjson_items, array_items, chunked
+from src.services.messages import NOT_FOUND, INVALID_CURSOR, INVALID_FIELDS, DUPLICATE_EMAIL, \
+    DUPLICATE_PHONE, DUPLICATE_CONTACT, INVALID_JSON, INVALID_BULK_BODY
+from src.services.export import ndjson_lines, csv_lines
+from src.services.pagination import encode_cursor, decode_cursor
+from src.services.rate_limit import read_limit, write_limit, search_limit
+from src.services.response_cache import response_cache, render
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
 
+PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+BULK_CHUNK_SIZE = 1000
 
-@router.get("/search{part_to_search}", response_model=List[ResponseContact],
-            description=TO_MANY_REQUESTS,
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def searcher(field: str = Path(min_length=2, max_length=20), db: Session = Depends(get_db)):
+# List responses (all, bday, search) skip the response_model: the repository returns the ResponseContact columns
+# as plain dicts (rows=True) and they are encoded with orjson as they are. The values come from our own table,
+# so validating every row again through pydantic would only cost time. response_model stays for the OpenAPI schema.
+
+
+@router.get("/search{part_to_search}", response_model=List[ResponseContact], response_class=ORJSONResponse,
+            description=search_limit.description,
+            dependencies=[Depends(search_limit)])
+async def searcher(part_to_search: str = Path(min_length=2, max_length=20), db: AsyncSession = Depends(get_db),
+                   current_user: User = Depends(auth_service.get_current_user)):
     """
-    The searcher function searches for contacts in the database.
-        It takes a field as an argument and returns all contacts that match the search criteria.
+    The searcher function searches for contacts of the current user in the database.
+        It takes a part of a name, surname or email and returns all contacts that match the search criteria.
+        The matching rows are encoded to JSON with orjson as they come from the database.
 
-    :param field: str: Search for a contact in the database
+    :param part_to_search: str: Search for a contact in the database
     :param max_length: Limit the length of the field
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user
     :return: A list of contacts
     """
-    contacts = await repository_contacts.searcher(field, db)
+    contacts = await repository_contacts.searcher(part_to_search, current_user, db, rows=True)
     if not contacts:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
-    return contacts
+    return ORJSONResponse(contacts)
 
 
-@router.get("/bday", response_model=List[ResponseContact], description=TO_MANY_REQUESTS,
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def birthday_list(db: Session = Depends(get_db)):
+@router.get("/bday", response_model=List[ResponseContact], description=read_limit.description,
+            dependencies=[Depends(read_limit)])
+async def birthday_list(request: Request, days: int = Query(7, ge=0, le=366), db: AsyncSession = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
     """
-    The birthday_list function returns a list of contacts with birthdays in the current month.
+    The birthday_list function returns a list of the current user's contacts with birthdays in the next days.
+        The response is cached per user and per day, see ResponseCache.
 
-    :param db: Session: Pass the database connection to the function
-    :return: A list of contacts with a birthday in the next 7 days
+    :param request: Request: The request, for the response cache
+    :param days: int: How many days to look at, today included, 7 by default
+    :param db: AsyncSession: Pass the database connection to the function
+    :param current_user: User: Get the current user
+    :return: A list of contacts with a birthday in the next days
     """
-    contact = await repository_contacts.birthday_list(db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
-    return contact
+    async def build():
+        contact = await repository_contacts.birthday_list(current_user, db, days, rows=True)
+        if contact is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+        return orjson.dumps(contact), {}
+
+    return await response_cache.respond(request, current_user.id, build, extra={"today": date.today().isoformat()})
 
 
 @router.post('/create', response_model=ResponseContact, status_code=status.HTTP_201_CREATED,
-             description=TO_MANY_REQUESTS,
-             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def create_contact(body: ContactModel, db: Session = Depends(get_db),
+             description=write_limit.description,
+             dependencies=[Depends(write_limit)])
+async def create_contact(body: ContactModel, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The create_contact function creates a new contact in the database.
@@ -60,55 +88,167 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db),
             both of which are provided by dependency injection via FastAPI's Depends decorator.
 
     :param body: ContactModel: Get the contact data from the request body
-    :param db: Session: Pass the database connection to the function
+    :param db: AsyncSession: Pass the database connection to the function
     :param current_user: User: Get the current user
     :return: A contactmodel object
     """
     contact = await repository_contacts.create_contact(body, current_user, db)
+    await response_cache.invalidate(current_user.id)
     return contact
 
 
-@router.get('/all', response_model=List[ResponseContact], description=TO_MANY_REQUESTS,
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contacts(db: Session = Depends(get_db),
+@router.post('/bulk', response_model=BulkResponse, description=write_limit.description,
+             dependencies=[Depends(write_limit)])
+async def bulk_create_contacts(request: Request, db: AsyncSession = Depends(get_db),
+                               current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The bulk_create_contacts function imports many contacts at once.
+        The body is either a JSON array or NDJSON (Content-Type: application/x-ndjson), which is read as it arrives.
+        Rows are validated with ContactModel and inserted in chunks of BULK_CHUNK_SIZE, one transaction per chunk.
+        Invalid rows and rows whose email or phone is already taken are reported by their index in the body
+        and do not stop the import.
+
+    :param request: Request: Read the request body
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the database
+    :return: The number of created and failed rows and an error per failed row
+    """
+    if 'ndjson' in request.headers.get('content-type', ''):
+        items = ndjson_items(request.stream())
+    else:
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_JSON)
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=INVALID_BULK_BODY)
+        items = array_items(payload)
+
+    conflicts = {'email': DUPLICATE_EMAIL, 'phone': DUPLICATE_PHONE, None: DUPLICATE_CONTACT}
+    report = BulkResponse(errors=[])
+    offset = 0
+    async for chunk in chunked(items, BULK_CHUNK_SIZE):
+        bodies, positions = [], []
+        for index, item in enumerate(chunk, start=offset):
+            if isinstance(item, BulkFormatError):
+                report.errors.append(BulkRowResult(index=index, detail=INVALID_JSON))
+                continue
+            try:
+                bodies.append(ContactModel.parse_obj(item))
+                positions.append(index)
+            except ValidationError as e:
+                report.errors.append(BulkRowResult(index=index, detail=e.errors()))
+        offset += len(chunk)
+        if not bodies:
+            continue
+        outcome = await repository_contacts.create_contacts(bodies, current_user, db)
+        for index, result in zip(positions, outcome):
+            if isinstance(result, int):
+                report.created += 1
+            else:
+                report.errors.append(BulkRowResult(index=index, detail=conflicts[result]))
+    report.failed = len(report.errors)
+    if report.created:
+        await response_cache.invalidate(current_user.id)
+    report.errors.sort(key=lambda error: error.index)
+    return report
+
+
+@router.get('/all', response_model=List[ResponseContact], description=read_limit.description,
+            dependencies=[Depends(read_limit)])
+async def get_contacts(request: Request, limit: int = Query(PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+                       cursor: Optional[str] = Query(None), fields: Optional[str] = Query(None),
+                       db: AsyncSession = Depends(get_db),
                        current_user: User = Depends(auth_service.get_current_user)):
     """
-    The get_contacts function returns a list of contacts for the current user.
-        The function is called by the get_contacts endpoint, which is defined in
-        main.py and mapped to /api/v{ver}/contacts.
+    The get_contacts function returns a page of contacts for the current user.
+        The page is at most limit contacts long. If there are more, the X-Next-Cursor header holds
+        the cursor to pass back to get the next page. The fields parameter is a comma separated list of
+        contact fields; the repository selects only those columns, and the rows are returned as they are.
+        Pages are cached per user until their contacts change, see ResponseCache.
 
-    :param db: Session: Get the database session,
+    :param request: Request: The request, for the response cache
+    :param limit: int: The maximum number of contacts on the page
+    :param cursor: Optional[str]: The cursor from the previous page
+    :param fields: Optional[str]: Comma separated list of fields to return
+    :param db: AsyncSession: Get the database session,
     :param current_user: User: Get the current user from the database
     :return: A list of contacts
     """
-    contacts = await repository_contacts.get_contacts(current_user, db)
-    if contacts is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
-    return contacts
+    after_id = None
+    if cursor is not None:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_CURSOR)
+    selected = None
+    if fields is not None:
+        selected = [field.strip() for field in fields.split(',') if field.strip()]
+        if not selected or any(field not in ResponseContact.__fields__ for field in selected):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=INVALID_FIELDS)
+
+    async def build():
+        contacts = await repository_contacts.get_contacts(current_user, db, limit + 1, after_id, selected, rows=True)
+        if contacts is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+        headers = {}
+        if len(contacts) > limit:
+            contacts = contacts[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(contacts[-1]["id"])
+        return orjson.dumps(contacts), headers
+
+    return await response_cache.respond(request, current_user.id, build)
+
+
+@router.get('/export', response_class=StreamingResponse, description=read_limit.description,
+            dependencies=[Depends(read_limit)])
+async def export_contacts(export_format: str = Query('ndjson', alias='format', regex='^(ndjson|csv)$'),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The export_contacts function streams the whole contact book of the current user.
+        Rows are written to the response as they are read from the database,
+        so the export never holds the full list in memory.
+
+    :param export_format: str: Either ndjson (default) or csv
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the database
+    :return: A streaming response with the contacts
+    """
+    batches = repository_contacts.stream_contacts(current_user, db)
+    if export_format == 'csv':
+        return StreamingResponse(csv_lines(batches, repository_contacts.EXPORT_FIELDS), media_type='text/csv',
+                                 headers={'Content-Disposition': 'attachment; filename="contacts.csv"'})
+    return StreamingResponse(ndjson_lines(batches), media_type='application/x-ndjson')
 
 
-@router.get('/{contact_id}', response_model=ResponseContact, description=TO_MANY_REQUESTS,
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contact(contact_id: int = Path(1, ge=1), db: Session = Depends(get_db),
+@router.get('/{contact_id}', response_model=ResponseContact, description=read_limit.description,
+            dependencies=[Depends(read_limit)])
+async def get_contact(request: Request, contact_id: int = Path(1, ge=1), db: AsyncSession = Depends(get_db),
                       current_user: User = Depends(auth_service.get_current_user)):
     """
     The get_contact function returns a contact by its id.
+        The response is cached per user until their contacts change, see ResponseCache.
 
+    :param request: Request: The request, for the response cache
     :param contact_id: int: Specify the contact id to be returned
     :param ge: Set the minimum value of the parameter
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user from the database
     :return: A contact object
     """
-    contact = await repository_contacts.get_contact(contact_id, current_user, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
-    return contact
+    async def build():
+        contact = await repository_contacts.get_contact(contact_id, current_user, db)
+        if contact is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+        return render(ResponseContact, contact), {}
 
+    return await response_cache.respond(request, current_user.id, build)
 
-@router.put("/update/{contact_id}", response_model=ResponseContact, description=TO_MANY_REQUESTS,
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def update_contact(body: ContactModel, contact_id: int = Path(1, ge=1), db: Session = Depends(get_db),
+
+@router.put("/update/{contact_id}", response_model=ResponseContact, description=write_limit.description,
+            dependencies=[Depends(write_limit)])
+async def update_contact(body: ContactModel, contact_id: int = Path(1, ge=1), db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The update_contact function updates a contact in the database.
@@ -118,20 +258,43 @@ async def update_contact(body: ContactModel, contact_id: int = Path(1, ge=1), db
     :param body: ContactModel: Pass the data from the request body to the function
     :param contact_id: int: Specify the contact to be deleted
     :param ge: Specify that the contact_id must be greater than or equal to 1
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user from the auth_service
     :return: A contactmodel object
     """
     contact = await repository_contacts.update_contact(body, contact_id, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+    await response_cache.invalidate(current_user.id)
+    return contact
+
+
+@router.patch("/update/{contact_id}", response_model=ResponseContact, description=write_limit.description,
+              dependencies=[Depends(write_limit)])
+async def patch_contact(body: ContactUpdateModel, contact_id: int = Path(1, ge=1), db: AsyncSession = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The patch_contact function partially updates a contact in the database.
+        Only the fields present in the request body are written; the others keep their values.
+
+    :param body: ContactUpdateModel: The fields to change
+    :param contact_id: int: Specify the contact to be updated
+    :param ge: Specify that the contact_id must be greater than or equal to 1
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the auth_service
+    :return: The updated contact
+    """
+    contact = await repository_contacts.patch_contact(body, contact_id, current_user, db)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+    await response_cache.invalidate(current_user.id)
     return contact
 
 
 @router.delete("/delete/{contact_id}", status_code=status.HTTP_204_NO_CONTENT,
-               description=TO_MANY_REQUESTS,
-               dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def remove_contact(contact_id: int = Path(1, ge=1), db: Session = Depends(get_db),
+               description=write_limit.description,
+               dependencies=[Depends(write_limit)])
+async def remove_contact(contact_id: int = Path(1, ge=1), db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The remove_contact function removes a contact from the database.
@@ -140,11 +303,12 @@ async def remove_contact(contact_id: int = Path(1, ge=1), db: Session = Depends(
 
     :param contact_id: int: Get the contact id from the url
     :param ge: Specify that the value of the parameter must be greater than or equal to 1
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Get the user from the database
     :return: A contact object
     """
     contact = await repository_contacts.remove_contact(contact_id, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=NOT_FOUND)
+    await response_cache.invalidate(current_user.id)
     return contact
@@ -1,7 +1,7 @@
 from datetime import date as birth_date
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, validator
 
 
 class ContactModel(BaseModel):
@@ -12,6 +12,22 @@ class ContactModel(BaseModel):
     birthday: birth_date
     additionally: str = Field(min_length=3, max_length=300)
 
+
+class ContactUpdateModel(BaseModel):
+    name: Optional[str] = Field(min_length=2, max_length=15)
+    surname: Optional[str] = Field(min_length=2, max_length=15)
+    email: Optional[EmailStr]
+    phone: Optional[str] = Field(min_length=6, max_length=16)
+    birthday: Optional[birth_date]
+    additionally: Optional[str] = Field(min_length=3, max_length=300)
+
+    @validator('*', pre=True)
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError('may be omitted but not null')
+        return value
+
+
 class ResponseContact(BaseModel):
     id: int = 1
     name: str = "Vitalii"
@@ -25,6 +41,17 @@ class ResponseContact(BaseModel):
         orm_mode = True
 
 
+class BulkRowResult(BaseModel):
+    index: int
+    detail: str | list
+
+
+class BulkResponse(BaseModel):
+    created: int = 0
+    failed: int = 0
+    errors: List[BulkRowResult] = []
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=2, max_length=16)
     email: str
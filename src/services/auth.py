@@ -1,50 +1,103 @@
-import pickle
+import hashlib
+import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
-import redis
+from dotenv import load_dotenv
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf.config import settings
 from src.database.connect import get_db
 from src.repository import users as repository_users
-from src.services.messages import INVALID_SCOPE, NOT_VALIDATE_CREDENTIALS, FAIL_EMAIL_VERIFICATION
+from src.services.hashing_pool import HashingPool, PoolOverloaded
+from src.services.jwt_backend import TokenError, get_jwt_backend
+from src.services.local_cache import LocalCache
+from src.services.messages import INVALID_SCOPE, NOT_VALIDATE_CREDENTIALS, FAIL_EMAIL_VERIFICATION, SERVER_BUSY
+from src.services.passwords import make_pwd_context
+from src.services.redis_pool import redis_client
+from src.services.user_cache import user_cache_key, dump_user, load_user
+
+load_dotenv()
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return Auth.pwd_context.verify(plain_password, hashed_password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return Auth.pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _hash(password: str) -> str:
+    return Auth.pwd_context.hash(password)
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = make_pwd_context()
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    r = redis_client
+    # L1 in front of Redis; short ttl because other workers' entries are only invalidated by expiry
+    user_cache = LocalCache(maxsize=4096, ttl=60)
+    USER_CACHE_TTL = 900
+    # Password hashing takes 100-300ms of CPU, so it runs on a bounded pool instead of the event loop
+    hashing_pool = HashingPool(max_workers=int(os.environ.get('HASHING_POOL_WORKERS', 4)),
+                               max_queue=int(os.environ.get('HASHING_POOL_QUEUE', 32)),
+                               kind=os.environ.get('HASHING_POOL_KIND', 'thread'))
+    HASHING_RETRY_AFTER = int(os.environ.get('HASHING_RETRY_AFTER', 1))
+    jwt = get_jwt_backend(os.environ.get('JWT_BACKEND', 'jose'))
+    # Verified claims by token digest, so a token seen again skips the signature check until it expires
+    claims_cache = LocalCache(maxsize=int(os.environ.get('JWT_CLAIMS_CACHE_SIZE', 8192)), ttl=300)
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and hashed
         password as arguments. It then uses the pwd_context object to verify that the
-        plain-text password matches the hashed one.
+        plain-text password matches the hashed one. The check runs on the hashing pool.
 
         :param self: Make the method a bound method, which means that it can be called on an instance of the class
         :param plain_password: Compare the password entered by the user to the hashed_password stored in our database
         :param hashed_password: Compare the password that is entered by the user to the hashed password in our database
         :return: A boolean
+        :raises HTTPException: 503 with Retry-After if the hashing pool is overloaded
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self._run_hashing(_verify, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        """
+        The verify_and_update_password function checks the password like verify_password and, if it matches
+        but the stored hash uses a deprecated scheme or outdated cost, also returns a fresh hash to store.
+
+        :param self: Represent the instance of the class
+        :param plain_password: The password entered by the user
+        :param hashed_password: The hash stored in our database
+        :return: A tuple (matches, new hash or None)
+        :raises HTTPException: 503 with Retry-After if the hashing pool is overloaded
+        """
+        return await self._run_hashing(_verify_and_update, plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
-        The hash is generated using the pwd_context object, which is an instance of Flask-Bcrypt's Bcrypt class.
+        The hash is generated with the pwd_context object on the hashing pool.
 
         :param self: Represent the instance of the class
         :param password: str: Pass in the password that we want to hash
         :return: A hash of the password
+        :raises HTTPException: 503 with Retry-After if the hashing pool is overloaded
         """
-        return self.pwd_context.hash(password)
+        return await self._run_hashing(_hash, password)
+
+    async def _run_hashing(self, func, *args):
+        try:
+            return await self.hashing_pool.run(func, *args)
+        except PoolOverloaded:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=SERVER_BUSY,
+                                headers={"Retry-After": str(self.HASHING_RETRY_AFTER)})
 
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
@@ -65,7 +118,7 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
-        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_access_token = self.jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
     async def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -86,9 +139,33 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
-        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_refresh_token = self.jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
+    def decode_token(self, token: str) -> dict:
+        """
+        The decode_token function verifies a token and returns its claims.
+        Verified claims are cached by the SHA-256 digest of the token until the token's exp,
+        so repeated requests with the same token skip the signature verification.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded JWT
+        :return: The claims of the token
+        :raises TokenError: If the token is malformed, badly signed or expired
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        payload = self.claims_cache.get(digest)
+        if payload is not None:
+            if payload.get("exp") is None or payload["exp"] > time.time():
+                return payload
+            self.claims_cache.pop(digest)
+            raise TokenError("Signature has expired")
+        payload = self.jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        ttl = payload["exp"] - time.time() if isinstance(payload.get("exp"), (int, float)) else None
+        if ttl is None or ttl > 0:
+            self.claims_cache.set(digest, payload, ttl=None if ttl is None else min(ttl, self.claims_cache.ttl))
+        return payload
+
     async def decode_refresh_token(self, refresh_token: str):
         """
         The decode_refresh_token function decodes the refresh token and returns the email of the user.
@@ -99,15 +176,15 @@ class Auth:
         :return: The email of the user
         """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(refresh_token)
             if payload['scope'] == 'refresh_token':
                 email = payload['sub']
                 return email
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_SCOPE)
-        except JWTError:
+        except TokenError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=NOT_VALIDATE_CREDENTIALS)
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be called by the FastAPI
         dependency injection system to get the current user, if there's one.
@@ -117,7 +194,7 @@ class Auth:
 
         :param self: Represent the instance of a class
         :param token: str: Get the token from the header of the request
-        :param db: Session: Get the database session
+        :param db: AsyncSession: Get the database session
         :return: The user object from the database if it exists
         """
         credentials_exception = HTTPException(
@@ -127,27 +204,41 @@ class Auth:
         )
 
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
                     raise credentials_exception
             else:
                 raise credentials_exception
-        except JWTError as e:
+        except TokenError as e:
             print(e)
             raise credentials_exception
-        user = self.r.get(f"user:{email}")
+        user = self.user_cache.get(email)
+        if user is not None:
+            return user
+        cached = await self.r.get(user_cache_key(email))
+        user = load_user(cached) if cached is not None else None
         if user is None:
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            await self.r.set(user_cache_key(email), dump_user(user), ex=self.USER_CACHE_TTL)
+        self.user_cache.set(email, user)
         return user
 
+    async def invalidate_user(self, email: str):
+        """
+        The invalidate_user function drops the cached user from the local cache and from Redis.
+        It has to be called whenever a change to the user must be seen by the next authenticated request.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the changed user
+        :return: None
+        """
+        self.user_cache.pop(email)
+        await self.r.delete(user_cache_key(email))
+
     def create_email_token(self, data: dict):
         """
         The create_email_token function takes a dictionary of data and returns a token.
@@ -161,7 +252,7 @@ class Auth:
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire})
-        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        token = self.jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return token
 
     async def get_email_from_token(self, token: str):
@@ -174,10 +265,10 @@ class Auth:
         :return: The email of the user who is trying to log in
         """
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             email = payload["sub"]
             return email
-        except JWTError as e:
+        except TokenError as e:
             print(e)
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail=FAIL_EMAIL_VERIFICATION)
@@ -0,0 +1,153 @@
+import logging
+import os
+from functools import lru_cache
+from hashlib import md5
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import update
+
+from src.database.connect import AsyncSessionLocal
+from src.database.models import User
+from src.services.jobs import job_queue
+from src.services.redis_pool import redis_client
+from src.services.user_cache import user_cache_key
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+GRAVATAR_URL = "https://www.gravatar.com/avatar/"
+AVATAR_PREFETCH = os.environ.get('AVATAR_PREFETCH', 'false').lower() in ('1', 'true', 'yes')
+AVATAR_TIMEOUT = float(os.environ.get('AVATAR_TIMEOUT', 3))
+AVATAR_VERIFY_TTL = int(os.environ.get('AVATAR_VERIFY_TTL', 7 * 24 * 3600))
+# Gravatar default image stored for addresses Gravatar has no image for: identicon, monsterid, retro, robohash, ...
+AVATAR_FALLBACK = os.environ.get('AVATAR_FALLBACK', 'identicon')
+
+
+def email_hash(email: str) -> str:
+    """
+    The email_hash function returns the Gravatar hash of an address: md5 of the trimmed, lower-cased email.
+
+    :param email: str: The email address
+    :return: The hex digest
+    """
+    return md5(email.strip().lower().encode("utf-8"), usedforsecurity=False).hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def avatar_url(email: str) -> str:
+    """
+    The avatar_url function returns the Gravatar image url of an address.
+        It is computed from the email alone, without any request to Gravatar, and memoized.
+        Gravatar serves its default image for addresses it does not know.
+
+    :param email: str: The email address
+    :return: The image url, the same one libgravatar's Gravatar(email).get_image() builds
+    """
+    return GRAVATAR_URL + email_hash(email)
+
+
+def fallback_avatar_url(email: str, style: str = AVATAR_FALLBACK) -> str:
+    """
+    The fallback_avatar_url function returns the url of the image Gravatar generates for an address without one.
+
+    :param email: str: The email address
+    :param style: str: The Gravatar default image style
+    :return: The image url
+    """
+    return f"{avatar_url(email)}?d={style}"
+
+
+class AvatarService:
+    """
+    Resolves avatars without putting any network call on the request path.
+        The url is computed locally. Checking that Gravatar really has an image for the address is optional
+        (AVATAR_PREFETCH) and runs as a verify_avatar job in the worker, with a timeout. Users without a Gravatar
+        image get the generated AVATAR_FALLBACK image instead of Gravatar's logo.
+        An address is checked at most once per AVATAR_VERIFY_TTL.
+    """
+
+    def __init__(self, redis, session_factory=AsyncSessionLocal, prefetch: bool = AVATAR_PREFETCH,
+                 timeout: float = AVATAR_TIMEOUT, verify_ttl: int = AVATAR_VERIFY_TTL):
+        self.r = redis
+        self.session_factory = session_factory
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.verify_ttl = verify_ttl
+
+    @staticmethod
+    def url(email: str) -> str:
+        return avatar_url(email)
+
+    @staticmethod
+    def job_key(email: str) -> str:
+        return f"avatar:v1:{email_hash(email)}"
+
+    async def schedule_verify(self, email: str) -> str | None:
+        """
+        The schedule_verify function enqueues the verify_avatar job for the address when prefetching is on.
+
+        :param email: str: The email address
+        :return: The job id, or None if prefetching is off or the address is already being checked
+        """
+        if not self.prefetch:
+            return None
+        return await job_queue.enqueue("verify_avatar", idempotency_key=self.job_key(email),
+                                       idempotency_ttl=self.verify_ttl, email=email)
+
+    async def verify(self, email: str) -> bool | None:
+        """
+        The verify function asks Gravatar whether it has an image for the address.
+            With d=404 Gravatar answers 404 instead of its default image, so a HEAD request is enough.
+
+        :param email: str: The email address
+        :return: True or False, or None if Gravatar did not answer within the timeout
+        """
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.head(self.url(email), params={"d": "404"})
+        except httpx.HTTPError as error:
+            logger.warning("Gravatar check of %s failed: %r", email_hash(email), error)
+            return None
+        if response.status_code not in (200, 404):
+            return None
+        return response.status_code == 200
+
+    async def use_fallback(self, email: str) -> bool:
+        """
+        The use_fallback function gives the user with the address the fallback image as avatar,
+        unless the avatar was changed from the Gravatar url since signup. The cached user record is dropped.
+
+        :param email: str: The email address of the user
+        :return: True if the avatar was replaced
+        """
+        stmt = update(User) \
+            .where(User.email == email, User.avatar == avatar_url(email)) \
+            .values(avatar=fallback_avatar_url(email))
+        async with self.session_factory() as db:
+            result = await db.execute(stmt)
+            await db.commit()
+        if not result.rowcount:
+            return False
+        await self.r.delete(user_cache_key(email))
+        return True
+
+
+avatar_service = AvatarService(redis_client)
+
+
+@job_queue.task("verify_avatar")
+async def verify_avatar(email: str):
+    """
+    The verify_avatar function is the handler of the verify_avatar job.
+    A user Gravatar has no image for gets the fallback avatar. A check Gravatar did not answer raises,
+    so the job queue retries it later.
+
+    :param email: str: The email address to check
+    :return: None
+    """
+    found = await avatar_service.verify(email)
+    if found is None:
+        raise TimeoutError(f"Gravatar did not answer for {email_hash(email)}")
+    if not found:
+        await avatar_service.use_fallback(email)
@@ -0,0 +1,62 @@
+import json
+from typing import AsyncIterator, Iterable
+
+
+class BulkFormatError(ValueError):
+    """Raised when a bulk payload is not a JSON array or valid NDJSON."""
+
+
+async def ndjson_items(stream: AsyncIterator[bytes]):
+    """
+    The ndjson_items function parses a newline delimited JSON body as it arrives.
+        Blank lines are skipped, a line that is not valid JSON is yielded as a BulkFormatError
+        so the caller can report it for that row and go on.
+
+    :param stream: AsyncIterator[bytes]: The request body stream
+    :return: An async generator of parsed items
+    """
+    buffer = b""
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _loads(line)
+    if buffer.strip():
+        yield _loads(buffer)
+
+
+async def array_items(items: Iterable):
+    """
+    The array_items function adapts an already parsed JSON array to the same async interface as ndjson_items.
+
+    :param items: Iterable: The parsed array
+    :return: An async generator of items
+    """
+    for item in items:
+        yield item
+
+
+async def chunked(items: AsyncIterator, size: int):
+    """
+    The chunked function groups an async stream of items into lists of at most size items.
+
+    :param items: AsyncIterator: The items to group
+    :param size: int: The chunk size
+    :return: An async generator of lists
+    """
+    chunk = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _loads(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return BulkFormatError(str(e))
@@ -1,11 +1,16 @@
+import os
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from dotenv import load_dotenv
+from fastapi_mail import MessageSchema, ConnectionConfig, MessageType
 from pydantic import EmailStr
 
 from src.conf.config import settings
 from src.services.auth import auth_service
+from src.services.jobs import job_queue
+from src.services.mailer import Mailer
+
+load_dotenv()
 
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.mail_username,
@@ -21,10 +26,27 @@ conf = ConnectionConfig(
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
 )
 
+# A confirmation email is sent at most once per address in this many seconds, however often it is requested
+CONFIRMATION_EMAIL_INTERVAL = int(os.environ.get('CONFIRMATION_EMAIL_INTERVAL', 300))
+
+# Concurrency is the number of SMTP connections a worker process keeps open at most
+mailer = Mailer(
+    conf,
+    concurrency=int(os.environ.get('MAIL_CONCURRENCY', 2)),
+    batch_size=int(os.environ.get('MAIL_BATCH_SIZE', 20)),
+    max_queue=int(os.environ.get('MAIL_QUEUE_SIZE', 1000)),
+    max_retries=int(os.environ.get('MAIL_MAX_RETRIES', 3)),
+    backoff=float(os.environ.get('MAIL_RETRY_BACKOFF', 1.0)),
+    idle_timeout=float(os.environ.get('MAIL_IDLE_TIMEOUT', 30)),
+)
+
 
+@job_queue.task("send_email")
 async def send_email(email: EmailStr, username: str, host: str):
     """
     The send_email function sends an email to the user with a link to confirm their email address.
+        It is the handler of the send_email job and runs in the job worker, see worker.py. The mailer renders
+        and sends the message over a pooled SMTP connection; if it still fails the job queue retries it later.
         The function takes in three parameters:
             -email: EmailStr, the user's email address.
             -username: str, the username of the user who is registering for an account.  This will be used in a greeting message within the body of the email sent to them.
@@ -33,18 +55,29 @@ async def send_email(email: EmailStr, username: str, host: str):
     :param email: EmailStr: Specify the email address of the recipient
     :param username: str: Pass the username to the email template
     :param host: str: Pass the host name to the email template
-    :return: A coroutine
+    :return: None
+    """
+    token_verification = auth_service.create_email_token({"sub": email})
+    message = MessageSchema(
+        subject="Confirm your email ",
+        recipients=[email],
+        template_body={"host": host, "username": username, "token": token_verification},
+        subtype=MessageType.html
+    )
+    await mailer.send(message, template_name="email_template.html")
+
+
+async def queue_confirmation_email(email: EmailStr, username: str, host: str):
+    """
+    The queue_confirmation_email function enqueues the send_email job for the job worker and returns right away.
+        The job is keyed by the address, so a repeated signup or request_email within
+        CONFIRMATION_EMAIL_INTERVAL seconds does not send a second email.
+
+    :param email: EmailStr: Specify the email address of the recipient
+    :param username: str: Pass the username to the email template
+    :param host: str: Pass the host name to the email template
+    :return: The job id, or None if an email to this address is already on its way
     """
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    return await job_queue.enqueue("send_email", idempotency_key=f"confirm:{email}",
+                                   idempotency_ttl=CONFIRMATION_EMAIL_INTERVAL,
+                                   email=email, username=username, host=str(host))
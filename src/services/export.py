@@ -0,0 +1,45 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import AsyncIterator
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def ndjson_lines(batches: AsyncIterator[list[dict]]):
+    """
+    The ndjson_lines function turns batches of rows into newline delimited JSON, one chunk per batch.
+
+    :param batches: AsyncIterator[list[dict]]: The rows to encode
+    :return: An async generator of str chunks
+    """
+    async for batch in batches:
+        yield "".join(json.dumps(row, default=_default) + "\n" for row in batch)
+
+
+async def csv_lines(batches: AsyncIterator[list[dict]], fields: tuple[str, ...]):
+    """
+    The csv_lines function turns batches of rows into CSV with a header line, one chunk per batch.
+
+    :param batches: AsyncIterator[list[dict]]: The rows to encode
+    :param fields: tuple[str, ...]: The column names, in order
+    :return: An async generator of str chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    async for batch in batches:
+        for row in batch:
+            writer.writerow({key: _default(value) if isinstance(value, date) else value for key, value in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,76 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable
+
+
+class PoolOverloaded(Exception):
+    """Raised when a HashingPool already has as many jobs waiting as it is allowed to queue."""
+
+
+class HashingPool:
+    """
+    Runs CPU heavy password hashing off the event loop on a bounded executor.
+        At most max_workers jobs run at a time and at most max_queue more wait for a worker.
+        Anything beyond that is rejected right away with PoolOverloaded, so a burst of logins
+        turns into fast 503s instead of a growing backlog that stalls the whole worker.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32, kind: str = "thread"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hashing")
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        return max(self.in_flight - self.max_workers, 0)
+
+    async def run(self, func: Callable, *args):
+        """
+        The run function calls func(*args) on the executor and waits for the result without blocking the loop.
+
+        :param func: Callable: A picklable function when the pool uses processes
+        :param args: The arguments of func
+        :return: What func returns
+        :raises PoolOverloaded: If the queue is already full
+        """
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PoolOverloaded()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the pool size and its queue depth counters.
+
+        :return: A dict with workers, in_flight, queued, completed and rejected
+        """
+        return {"workers": self.max_workers, "in_flight": self.in_flight, "queued": self.queued,
+                "completed": self.completed, "rejected": self.rejected}
+
+    def shutdown(self) -> None:
+        """
+        The shutdown function stops the executor, if it was started.
+
+        :return: None
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
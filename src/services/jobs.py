@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Awaitable, Callable
+
+import orjson
+from dotenv import load_dotenv
+
+from src.services.metrics import JOBS_ENQUEUED, JOBS_PROCESSED, JOB_DURATION, JOB_QUEUE_DEPTH
+from src.services.redis_pool import redis_client
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+JOBS_QUEUE = os.environ.get('JOBS_QUEUE', 'default')
+JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+JOBS_RETRY_BACKOFF = float(os.environ.get('JOBS_RETRY_BACKOFF', 5))
+JOBS_VISIBILITY_TIMEOUT = float(os.environ.get('JOBS_VISIBILITY_TIMEOUT', 120))
+
+# Moves up to ARGV[2] members of a sorted set whose score is due (<= ARGV[1]) to the head of a list.
+# KEYS[3], when given, is a list the member is also removed from (a lease that ran out).
+MOVE_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    if KEYS[3] == nil or redis.call('LREM', KEYS[3], 1, member) > 0 then
+        redis.call('LPUSH', KEYS[2], member)
+    end
+end
+return #due
+"""
+
+# Leases, until ARGV[1], the members of the list KEYS[1] that have no score in the sorted set KEYS[2]:
+# jobs a worker moved to processing but died before it could lease them.
+LEASE_ORPHANS = """
+local leased = 0
+for _, member in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    if not redis.call('ZSCORE', KEYS[2], member) then
+        redis.call('ZADD', KEYS[2], ARGV[1], member)
+        leased = leased + 1
+    end
+end
+return leased
+"""
+
+
+class JobQueue:
+    """
+    A durable job queue on Redis lists, shared by the API processes that enqueue and the worker that runs the jobs.
+        ready       list of jobs waiting for a worker, pushed on the left and taken from the right
+        processing  list of jobs a worker has taken; every one has a lease in the leases sorted set.
+                    A job whose lease runs out (the worker died) goes back to ready.
+        delayed     sorted set of jobs waiting for their retry time
+        dead        list of jobs that failed max_attempts times or have no handler
+    A worker moves a job from ready to processing with one BLMOVE, so a crash never loses it. The lease is added
+    right after; a job whose worker died in between is leased by the next promote and comes back when that runs out.
+    Jobs may therefore run more than once and handlers should be idempotent. Idempotency keys only stop the same
+    job from being enqueued twice while the key lives.
+    """
+
+    def __init__(self, redis, name: str = JOBS_QUEUE, max_attempts: int = JOBS_MAX_ATTEMPTS,
+                 backoff: float = JOBS_RETRY_BACKOFF, visibility_timeout: float = JOBS_VISIBILITY_TIMEOUT):
+        self.redis = redis
+        self.name = name
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.visibility_timeout = visibility_timeout
+        self.handlers: dict[str, Callable[..., Awaitable]] = {}
+
+    def key(self, state: str) -> str:
+        return f"jobs:{self.name}:{state}"
+
+    def task(self, name: str | None = None):
+        """
+        The task function registers the decorated coroutine function as the handler of the jobs called name.
+
+        :param name: str | None: The job name, the function name if None
+        :return: A decorator that returns the function unchanged
+        """
+        def register(func):
+            self.handlers[name or func.__name__] = func
+            return func
+        return register
+
+    async def enqueue(self, name: str, /, idempotency_key: str | None = None, idempotency_ttl: int = 3600,
+                      max_attempts: int | None = None, **kwargs) -> str | None:
+        """
+        The enqueue function adds a job to the queue.
+
+        :param name: str: The registered job name, positional only so the handler may take a name argument
+        :param idempotency_key: str | None: Jobs with the same key are only enqueued once while the key lives
+        :param idempotency_ttl: int: Seconds the idempotency key lives
+        :param max_attempts: int | None: Override of the queue's max_attempts for this job
+        :param kwargs: The keyword arguments of the handler, they have to be JSON serializable
+        :return: The job id, or None if the idempotency key was already used
+        """
+        job_id = uuid.uuid4().hex
+        if idempotency_key is not None:
+            if not await self.redis.set(f"jobs:{self.name}:key:{idempotency_key}", job_id, nx=True,
+                                        ex=idempotency_ttl):
+                return None
+        job = {"id": job_id, "name": name, "kwargs": kwargs, "attempts": 0,
+               "max_attempts": max_attempts or self.max_attempts, "enqueued_at": time.time()}
+        await self.redis.lpush(self.key("ready"), orjson.dumps(job).decode())
+        JOBS_ENQUEUED.labels(name).inc()
+        return job_id
+
+    async def reserve(self, timeout: float = 1.0) -> tuple[str, dict] | None:
+        """
+        The reserve function takes the oldest ready job and leases it for visibility_timeout seconds.
+
+        :param timeout: float: Seconds to wait for a job, rounded up to whole seconds
+        :return: The raw job and the decoded job, or None if no job came in time
+        """
+        raw = await self.redis.blmove(self.key("ready"), self.key("processing"), math.ceil(timeout), "RIGHT", "LEFT")
+        if raw is None:
+            return None
+        await self.redis.zadd(self.key("leases"), {raw: time.time() + self.visibility_timeout})
+        return raw, orjson.loads(raw)
+
+    async def ack(self, raw: str) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(self.key("processing"), 1, raw)
+            pipe.zrem(self.key("leases"), raw)
+            await pipe.execute()
+
+    async def fail(self, raw: str, job: dict, error: Exception, retry: bool = True) -> str:
+        """
+        The fail function releases a job that raised, scheduling a retry with exponential backoff or,
+        once it has used up its attempts, moving it to the dead letter list.
+
+        :param raw: str: The job as reserved
+        :param job: dict: The decoded job
+        :param error: Exception: What the handler raised
+        :param retry: bool: False sends the job to the dead letter list right away
+        :return: "retry" or "dead"
+        """
+        job = {**job, "attempts": job["attempts"] + 1, "error": repr(error), "failed_at": time.time()}
+        outcome = "retry" if retry and job["attempts"] < job["max_attempts"] else "dead"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(self.key("processing"), 1, raw)
+            pipe.zrem(self.key("leases"), raw)
+            if outcome == "retry":
+                pipe.zadd(self.key("delayed"),
+                          {orjson.dumps(job).decode(): time.time() + self.backoff * 2 ** (job["attempts"] - 1)})
+            else:
+                pipe.lpush(self.key("dead"), orjson.dumps(job).decode())
+            await pipe.execute()
+        return outcome
+
+    async def promote(self, limit: int = 100) -> int:
+        """
+        The promote function moves delayed jobs whose retry time has come back to ready,
+        and jobs whose lease ran out from processing back to ready. Processing jobs without a lease get one.
+
+        :param limit: int: The most jobs to move of each kind
+        :return: How many jobs were moved
+        """
+        now = time.time()
+        orphans = await self.redis.eval(LEASE_ORPHANS, 2, self.key("processing"), self.key("leases"),
+                                        now + self.visibility_timeout)
+        if orphans:
+            logger.warning("Leased %d processing jobs that had no lease", orphans)
+        moved = await self.redis.eval(MOVE_DUE, 2, self.key("delayed"), self.key("ready"), now, limit)
+        moved += await self.redis.eval(MOVE_DUE, 3, self.key("leases"), self.key("ready"), self.key("processing"),
+                                       now, limit)
+        return moved
+
+    async def retry_dead(self) -> int:
+        """
+        The retry_dead function moves every dead job back to ready with a fresh set of attempts.
+
+        :return: How many jobs were moved
+        """
+        moved = 0
+        while (raw := await self.redis.rpop(self.key("dead"))) is not None:
+            job = {**orjson.loads(raw), "attempts": 0}
+            await self.redis.lpush(self.key("ready"), orjson.dumps(job).decode())
+            moved += 1
+        return moved
+
+    async def depth(self) -> dict[str, int]:
+        """
+        The depth function counts the jobs in every state and publishes the numbers as job_queue_depth.
+
+        :return: A dict of state to number of jobs
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.llen(self.key("ready"))
+            pipe.zcard(self.key("delayed"))
+            pipe.llen(self.key("processing"))
+            pipe.llen(self.key("dead"))
+            counts = dict(zip(("ready", "delayed", "processing", "dead"), await pipe.execute()))
+        for state, count in counts.items():
+            JOB_QUEUE_DEPTH.labels(self.name, state).set(count)
+        return counts
+
+    async def process(self, raw: str, job: dict) -> str:
+        """
+        The process function runs the handler of a reserved job and acks, retries or dead-letters it.
+
+        :param raw: str: The job as reserved
+        :param job: dict: The decoded job
+        :return: "done", "retry" or "dead"
+        """
+        handler = self.handlers.get(job["name"])
+        start = time.perf_counter()
+        if handler is None:
+            outcome = await self.fail(raw, job, LookupError(f"No handler for job {job['name']}"), retry=False)
+        else:
+            try:
+                await asyncio.wait_for(handler(**job["kwargs"]), self.visibility_timeout)
+            except Exception as error:
+                outcome = await self.fail(raw, job, error)
+                logger.warning("Job %s %s failed (attempt %d, %s): %r", job["name"], job["id"],
+                               job["attempts"] + 1, outcome, error)
+            else:
+                await self.ack(raw)
+                outcome = "done"
+        JOB_DURATION.labels(job["name"]).observe(time.perf_counter() - start)
+        JOBS_PROCESSED.labels(job["name"], outcome).inc()
+        return outcome
+
+    async def work(self, concurrency: int = 4, stop: asyncio.Event | None = None, poll: float = 1.0) -> None:
+        """
+        The work function runs jobs with concurrency consumers until stop is set.
+            A housekeeping loop promotes due retries, returns expired leases and refreshes the depth gauges.
+            Jobs that are running when stop is set are finished first.
+
+        :param concurrency: int: How many jobs run at the same time
+        :param stop: asyncio.Event | None: Set it to shut the workers down
+        :param poll: float: Seconds between housekeeping runs and the longest a consumer blocks on an empty queue
+        :return: None
+        """
+        stop = stop or asyncio.Event()
+
+        async def housekeeping():
+            while not stop.is_set():
+                try:
+                    await self.promote()
+                    await self.depth()
+                except Exception:
+                    logger.exception("Job queue housekeeping failed")
+                try:
+                    await asyncio.wait_for(stop.wait(), poll)
+                except asyncio.TimeoutError:
+                    pass
+
+        async def consume():
+            while not stop.is_set():
+                try:
+                    reserved = await self.reserve(timeout=poll)
+                except Exception:
+                    logger.exception("Could not reserve a job")
+                    await asyncio.sleep(poll)
+                    continue
+                if reserved is not None:
+                    await self.process(*reserved)
+
+        await asyncio.gather(housekeeping(), *(consume() for _ in range(concurrency)))
+
+
+job_queue = JobQueue(redis_client)
@@ -0,0 +1,57 @@
+class TokenError(Exception):
+    """Raised by every JWT backend for a token that is malformed, badly signed or expired."""
+
+
+class JoseBackend:
+    """JWT encoding and decoding with python-jose, the default backend."""
+    name = "jose"
+
+    def __init__(self):
+        from jose import JWTError, jwt
+        self._jwt = jwt
+        self._error = JWTError
+
+    def encode(self, claims: dict, key: str, algorithm: str) -> str:
+        return self._jwt.encode(claims, key, algorithm=algorithm)
+
+    def decode(self, token: str, key: str, algorithms: list[str]) -> dict:
+        try:
+            return self._jwt.decode(token, key, algorithms=algorithms)
+        except self._error as e:
+            raise TokenError(str(e)) from e
+
+
+class PyJWTBackend:
+    """JWT encoding and decoding with PyJWT; compare it with jose on the target host with benchmarks/bench_jwt.py."""
+    name = "pyjwt"
+
+    def __init__(self):
+        import jwt
+        self._jwt = jwt
+        self._error = jwt.PyJWTError
+
+    def encode(self, claims: dict, key: str, algorithm: str) -> str:
+        return self._jwt.encode(claims, key, algorithm=algorithm)
+
+    def decode(self, token: str, key: str, algorithms: list[str]) -> dict:
+        try:
+            return self._jwt.decode(token, key, algorithms=algorithms)
+        except self._error as e:
+            raise TokenError(str(e)) from e
+
+
+BACKENDS = {backend.name: backend for backend in (JoseBackend, PyJWTBackend)}
+
+
+def get_jwt_backend(name: str = "jose"):
+    """
+    The get_jwt_backend function returns the JWT backend with the given name.
+    Both backends produce and accept the same tokens, so switching does not log anybody out.
+
+    :param name: str: jose (default) or pyjwt, which needs the optional PyJWT package
+    :return: A backend instance with encode and decode methods
+    """
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown JWT backend {name!r}, expected one of {sorted(BACKENDS)}")
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LocalCache:
+    """
+    A bounded in-process LRU cache whose entries expire after ttl seconds.
+    It is not shared between workers, so it only fits data where a short staleness is acceptable.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default=None):
+        """
+        The get function returns the cached value and marks it as recently used.
+        Expired entries are dropped and count as a miss.
+
+        :param key: Hashable: The cache key
+        :param default: The value to return on a miss
+        :return: The cached value or default
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > self.clock():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        The set function stores a value, evicting the least recently used entry when the cache is full.
+
+        :param key: Hashable: The cache key
+        :param value: Any: The value to store
+        :param ttl: float | None: Seconds to keep the value, the cache default if None
+        :return: None
+        """
+        self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """
+        The pop function removes a key from the cache, if it is there.
+
+        :param key: Hashable: The cache key
+        :return: None
+        """
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        The clear function empties the cache and resets the counters.
+
+        :return: None
+        """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the size of the cache and its hit/miss counters.
+
+        :return: A dict with size, maxsize, hits and misses
+        """
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
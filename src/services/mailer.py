@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import random
+
+import aiosmtplib
+from fastapi_mail import ConnectionConfig, MessageSchema
+from fastapi_mail.fastmail import email_dispatched
+from fastapi_mail.msg import MailMsg
+from jinja2 import Template
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError)
+
+
+def is_permanent(error: Exception) -> bool:
+    """
+    The is_permanent function tells whether retrying a failed delivery is pointless,
+    i.e. the server refused the recipients or answered with a 5xx code.
+
+    :param error: Exception: The delivery error
+    :return: True if the message should not be retried
+    """
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and error.code >= 500
+
+
+class Mailer:
+    """
+    Sends email from a bounded in-process queue over long-lived SMTP connections.
+        Each of the concurrency workers keeps one connection open while there is mail and closes it after
+        idle_timeout seconds without any, so a signup wave costs concurrency SMTP sessions, not one per message.
+        A worker takes up to batch_size queued messages at a time and sends them over its connection.
+        Failed deliveries are retried max_retries times with exponential backoff and jitter;
+        permanent SMTP errors are not retried. Templates are compiled once and reused.
+    """
+
+    def __init__(self, config: ConnectionConfig, concurrency: int = 2, batch_size: int = 20, max_queue: int = 1000,
+                 max_retries: int = 3, backoff: float = 1.0, idle_timeout: float = 30.0):
+        self.config = config
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.connections = 0
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._templates: dict[str, Template] = {}
+        self._environment = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def template(self, name: str) -> Template:
+        """
+        The template function returns the compiled template, loading it from the template folder on first use.
+
+        :param name: str: File name of the template
+        :return: A jinja2 Template
+        """
+        if name not in self._templates:
+            if self._environment is None:
+                self._environment = self.config.template_engine()
+            self._templates[name] = self._environment.get_template(name)
+        return self._templates[name]
+
+    def start(self) -> None:
+        """
+        The start function creates the queue and the workers on the running event loop. Calling it again is a no-op.
+
+        :return: None
+        """
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._work(), name=f"mailer-{number}")
+                         for number in range(self.concurrency)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        The stop function waits up to timeout seconds for the queued mail to go out,
+        then stops the workers and closes their connections.
+
+        :param timeout: float: How long to wait for the queue to drain
+        :return: None
+        """
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Mailer stopped with %d messages still queued", self.depth)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def send(self, message: MessageSchema, template_name: str | None = None) -> None:
+        """
+        The send function queues a message and waits until it is delivered or given up on.
+            It waits for room when the queue is full instead of failing.
+
+        :param message: MessageSchema: The message, its template_body is rendered by the worker
+        :param template_name: str | None: The template to render the body with
+        :return: None
+        :raises Exception: The last delivery error if the message could not be sent
+        """
+        self.start()
+        delivered = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, template_name, delivered))
+        await delivered
+
+    async def _build(self, message: MessageSchema, template_name: str | None):
+        if template_name and message.template_body is not None:
+            message.template_body = self.template(template_name).render(**message.template_body)
+        sender = self.config.MAIL_FROM
+        if self.config.MAIL_FROM_NAME is not None:
+            sender = f"{self.config.MAIL_FROM_NAME} <{self.config.MAIL_FROM}>"
+        return await MailMsg(message)._message(sender)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(hostname=self.config.MAIL_SERVER, port=self.config.MAIL_PORT,
+                               timeout=self.config.TIMEOUT, use_tls=self.config.MAIL_SSL_TLS,
+                               start_tls=self.config.MAIL_STARTTLS, validate_certs=self.config.VALIDATE_CERTS)
+        await smtp.connect()
+        if self.config.USE_CREDENTIALS:
+            await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD)
+        self.connections += 1
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP | None) -> None:
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except RETRYABLE_ERRORS:
+            smtp.close()
+
+    async def _deliver(self, smtp: aiosmtplib.SMTP | None, message) -> tuple[aiosmtplib.SMTP | None, Exception | None]:
+        """
+        The _deliver function sends one message, (re)connecting and retrying as needed.
+
+        :param smtp: aiosmtplib.SMTP | None: The connection of the worker, None if it has none
+        :param message: The built email message
+        :return: The connection to use for the next message and the error if the message was given up on
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                if not self.config.SUPPRESS_SEND:
+                    if smtp is None or not smtp.is_connected:
+                        smtp = await self._connect()
+                    await smtp.send_message(message)
+                email_dispatched.send(message)
+                self.sent += 1
+                return smtp, None
+            except RETRYABLE_ERRORS as error:
+                await self._close(smtp)
+                smtp = None
+                if is_permanent(error) or attempt == self.max_retries:
+                    self.failed += 1
+                    logger.error("Giving up on email to %s after %d attempts: %s", message["To"], attempt + 1, error)
+                    return smtp, error
+                self.retried += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def _work(self) -> None:
+        smtp = None
+        try:
+            while True:
+                try:
+                    if smtp is None:
+                        item = await self._queue.get()
+                    else:
+                        item = await asyncio.wait_for(self._queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    await self._close(smtp)
+                    smtp = None
+                    continue
+                batch = [item]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                for message, template_name, delivered in batch:
+                    try:
+                        smtp, error = await self._deliver(smtp, await self._build(message, template_name))
+                    except Exception as build_error:
+                        self.failed += 1
+                        logger.exception("Could not build email to %s", message.recipients)
+                        error = build_error
+                    finally:
+                        self._queue.task_done()
+                    if not delivered.done():
+                        if error is None:
+                            delivered.set_result(None)
+                        else:
+                            delivered.set_exception(error)
+        finally:
+            await self._close(smtp)
@@ -15,4 +15,13 @@ FAIL_EMAIL_VERIFICATION = "Invalid token for email verification"
 DB_CONFIG_ERROR = "Database is not configured correctly"
 DB_CONNECT_ERROR = "Error connecting to the database"
 WELCOME_MESSAGE = "Welcome to FastAPI!"
-TO_MANY_REQUESTS = 'No more than 10 requests per minute'
+TO_MANY_REQUESTS = 'No more than {times} requests per {seconds} seconds'
+RATE_LIMITED = 'Too many requests'
+INVALID_CURSOR = "Invalid cursor"
+INVALID_FIELDS = "Unknown fields requested"
+DUPLICATE_EMAIL = "Contact with this email already exists"
+DUPLICATE_PHONE = "Contact with this phone already exists"
+DUPLICATE_CONTACT = "Contact with this email or phone already exists"
+INVALID_JSON = "Invalid JSON"
+INVALID_BULK_BODY = "Expected a JSON array or NDJSON body"
+SERVER_BUSY = "Server is busy, try again later"
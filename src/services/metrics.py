@@ -0,0 +1,98 @@
+import time
+from typing import Callable
+
+import redis.asyncio as redis
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.registry import Collector
+from starlette.requests import Request
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route",
+                            ["method", "route"])
+REQUESTS = Counter("http_requests_total", "HTTP responses by route and status code",
+                   ["method", "route", "status"])
+IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being handled", ["method"])
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Database statement latency", ["operation"],
+                             buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+JOBS_ENQUEUED = Counter("jobs_enqueued_total", "Background jobs enqueued", ["job"])
+JOBS_PROCESSED = Counter("jobs_processed_total", "Background jobs run by outcome (done, retry, dead)",
+                         ["job", "outcome"])
+JOB_DURATION = Histogram("job_duration_seconds", "Background job run time", ["job"],
+                         buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+JOB_QUEUE_DEPTH = Gauge("job_queue_depth", "Background jobs by state", ["queue", "state"])
+RESPONSE_CACHE = Counter("response_cache_requests_total", "Cached GET responses by outcome (hit, miss, not_modified)",
+                         ["route", "outcome"])
+RATE_LIMIT_CHECKS = Counter("rate_limit_checks_total",
+                            "Rate limit checks by route class and how they were answered "
+                            "(local, redis, local_rejected, rejected)", ["limit", "outcome"])
+REDIS_COMMAND_LATENCY = Histogram("redis_command_duration_seconds", "Redis command latency", ["command"],
+                                  buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25))
+
+
+def route_label(request: Request) -> str:
+    """
+    The route_label function returns the path template of the matched route, e.g. /api/contacts/{contact_id},
+    so ids in the url don't create a new time series per request.
+
+    :param request: Request: The handled request
+    :return: The route path or "unmatched"
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class TimedRedis(redis.Redis):
+    """A redis.asyncio client that records the latency of every command it sends."""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_LATENCY.labels(str(args[0]).upper()).observe(time.perf_counter() - start)
+
+
+def register_gauge(name: str, documentation: str, func: Callable[[], float]) -> Gauge:
+    """
+    The register_gauge function exposes a value that is read at scrape time and can go down, e.g. a pool size.
+
+    :param name: str: The metric name
+    :param documentation: str: The metric help text
+    :param func: Callable[[], float]: Returns the current value
+    :return: The gauge
+    """
+    gauge = Gauge(name, documentation)
+    gauge.set_function(func)
+    return gauge
+
+
+class CallbackCounter(Collector):
+    """A counter whose value is read at scrape time from a running total kept elsewhere."""
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+
+    def describe(self):
+        yield CounterMetricFamily(self.name, self.documentation)
+
+    def collect(self):
+        yield CounterMetricFamily(self.name, self.documentation, value=self.func())
+
+
+def register_counter(name: str, documentation: str, func: Callable[[], float],
+                     registry: CollectorRegistry = REGISTRY) -> CallbackCounter:
+    """
+    The register_counter function exposes a running total that is read at scrape time, e.g. the rejections of a pool,
+    as the counter name_total, so rate() and increase() treat a process restart as a counter reset.
+
+    :param name: str: The metric name, without the _total suffix
+    :param documentation: str: The metric help text
+    :param func: Callable[[], float]: Returns the current total, which only goes up
+    :param registry: CollectorRegistry: The registry to add the counter to
+    :return: The collector
+    """
+    collector = CallbackCounter(name, documentation, func)
+    registry.register(collector)
+    return collector
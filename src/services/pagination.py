@@ -0,0 +1,33 @@
+import base64
+import binascii
+import json
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    The encode_cursor function packs the position of the last returned row into an opaque token.
+    Clients send the token back as is to get the next page, so the format can change without breaking them.
+
+    :param last_id: int: The id of the last row of the current page
+    :return: A url-safe cursor string
+    """
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    The decode_cursor function unpacks a token made by encode_cursor.
+
+    :param cursor: str: The cursor received from the client
+    :return: The id the next page starts after
+    :raises ValueError: If the cursor is malformed
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_id = json.loads(payload)["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise ValueError("Malformed cursor") from e
+    if not isinstance(last_id, int):
+        raise ValueError("Malformed cursor")
+    return last_id
@@ -0,0 +1,36 @@
+import os
+
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+load_dotenv()
+
+# Defaults follow the OWASP argon2id baseline; tune them per host with benchmarks/bench_password_hash.py
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19456))
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+
+def make_pwd_context(time_cost: int = ARGON2_TIME_COST, memory_cost: int = ARGON2_MEMORY_COST,
+                     parallelism: int = ARGON2_PARALLELISM, bcrypt_rounds: int = BCRYPT_ROUNDS) -> CryptContext:
+    """
+    The make_pwd_context function builds the password hashing policy.
+        New hashes are argon2id with the given cost. bcrypt hashes still verify but are deprecated,
+        so needs_update() is true for them, as it is for argon2 hashes made with other cost parameters.
+
+    :param time_cost: int: argon2 iterations
+    :param memory_cost: int: argon2 memory in KiB
+    :param parallelism: int: argon2 lanes
+    :param bcrypt_rounds: int: bcrypt log2 rounds, used only when a bcrypt hash is explicitly requested
+    :return: A CryptContext
+    """
+    return CryptContext(
+        schemes=["argon2", "bcrypt"],
+        deprecated=["bcrypt"],
+        argon2__type="ID",
+        argon2__time_cost=time_cost,
+        argon2__memory_cost=memory_cost,
+        argon2__parallelism=parallelism,
+        bcrypt__rounds=bcrypt_rounds,
+    )
@@ -0,0 +1,162 @@
+import math
+import os
+import time
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request, status
+
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.local_cache import LocalCache
+from src.services.messages import RATE_LIMITED, TO_MANY_REQUESTS
+from src.services.metrics import RATE_LIMIT_CHECKS, route_label
+from src.services.redis_pool import redis_client
+
+load_dotenv()
+
+# "times/seconds" per route class
+RATE_LIMITS = {
+    "read": os.environ.get('RATE_LIMIT_READ', '120/60'),
+    "write": os.environ.get('RATE_LIMIT_WRITE', '30/60'),
+    "search": os.environ.get('RATE_LIMIT_SEARCH', '30/60'),
+}
+# Share of a bucket a worker takes from Redis at once
+RATE_LIMIT_BATCH = float(os.environ.get('RATE_LIMIT_BATCH', 0.1))
+
+# Token bucket: refills the bucket for the time since the last call, then takes up to ARGV[3] tokens.
+# Returns the tokens taken and, when none were, the seconds until one is available (a string: Lua numbers
+# are truncated to integers on the way back).
+TAKE_TOKENS = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local taken = math.min(wanted, math.floor(tokens))
+tokens = tokens - taken
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+local wait = 0
+if taken == 0 then
+    wait = (1 - tokens) / rate
+end
+return {taken, tostring(wait)}
+"""
+
+
+class Limit:
+    """A limit of times requests per seconds, refilled continuously at times / seconds tokens a second."""
+
+    __slots__ = ("times", "seconds")
+
+    def __init__(self, times: int, seconds: float):
+        self.times = times
+        self.seconds = seconds
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        times, seconds = value.split("/")
+        return cls(int(times), float(seconds))
+
+    @property
+    def rate(self) -> float:
+        return self.times / self.seconds
+
+    def __repr__(self):
+        return f"Limit({self.times}/{self.seconds:g})"
+
+
+class Lease:
+    """Tokens a worker took from a Redis bucket and spends locally, or the time the bucket was found empty until."""
+
+    __slots__ = ("tokens", "blocked_until")
+
+    def __init__(self, tokens: int = 0, blocked_until: float = 0.0):
+        self.tokens = tokens
+        self.blocked_until = blocked_until
+
+
+class RateLimiter:
+    """
+    Per-user, per-route token buckets kept in Redis, checked locally first.
+        A worker takes tokens from the Redis bucket in batches (batch * times of the limit) and spends them
+        without any round trip, so only one request in a batch goes to Redis. When Redis answers that the bucket
+        is empty, the worker remembers until when and rejects locally until then.
+        Leased tokens are removed from the shared bucket, so the workers together never let more than the limit
+        through; a lease lasts as long as the bucket takes to refill it, which bounds how long
+        one worker can hold tokens another worker's requests are refused for.
+        Limits are given per route class (read, write, search), each route has its own bucket per user.
+    """
+
+    def __init__(self, redis, limits: dict[str, str] = RATE_LIMITS, batch: float = RATE_LIMIT_BATCH,
+                 maxsize: int = 10000, clock=time.time):
+        self.redis = redis
+        self.limits = {name: Limit.parse(value) for name, value in limits.items()}
+        self.batch = batch
+        self.clock = clock
+        self.leases = LocalCache(maxsize=maxsize, clock=clock)
+
+    @staticmethod
+    def key(user_id: int, route: str) -> str:
+        return f"ratelimit:{route}:{user_id}"
+
+    async def acquire(self, user_id: int, route: str, limit_class: str) -> float:
+        """
+        The acquire function takes one token of the user's bucket for the route.
+
+        :param user_id: int: The user making the request
+        :param route: str: The route, every route has its own bucket
+        :param limit_class: str: The route class whose limit applies
+        :return: 0 if the request may go through, otherwise the seconds until it may be retried
+        """
+        limit = self.limits[limit_class]
+        now = self.clock()
+        lease = self.leases.get((user_id, route))
+        if lease is not None:
+            if lease.blocked_until > now:
+                RATE_LIMIT_CHECKS.labels(limit_class, "local_rejected").inc()
+                return lease.blocked_until - now
+            if lease.tokens > 0:
+                lease.tokens -= 1
+                RATE_LIMIT_CHECKS.labels(limit_class, "local").inc()
+                return 0.0
+        wanted = max(1, int(limit.times * self.batch))
+        taken, wait = await self.redis.eval(TAKE_TOKENS, 1, self.key(user_id, route), limit.times, limit.rate,
+                                            wanted, now)
+        taken, wait = int(taken), float(wait)
+        if taken == 0:
+            self.leases.set((user_id, route), Lease(blocked_until=now + wait), ttl=wait)
+            RATE_LIMIT_CHECKS.labels(limit_class, "rejected").inc()
+            return wait
+        if taken > 1:
+            self.leases.set((user_id, route), Lease(tokens=taken - 1), ttl=taken / limit.rate)
+        RATE_LIMIT_CHECKS.labels(limit_class, "redis").inc()
+        return 0.0
+
+    def limit(self, limit_class: str):
+        """
+        The limit function returns the dependency that applies the limit of the class to a route.
+            Requests over the limit get a 429 with a Retry-After header.
+
+        :param limit_class: str: The route class, a key of limits
+        :return: A FastAPI dependency
+        """
+        limit = self.limits[limit_class]
+
+        async def dependency(request: Request, current_user: User = Depends(auth_service.get_current_user)):
+            wait = await self.acquire(current_user.id, f"{request.method} {route_label(request)}", limit_class)
+            if wait > 0:
+                raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=RATE_LIMITED,
+                                    headers={"Retry-After": str(math.ceil(wait))})
+
+        dependency.description = TO_MANY_REQUESTS.format(times=limit.times, seconds=f"{limit.seconds:g}")
+        return dependency
+
+
+rate_limiter = RateLimiter(redis_client)
+read_limit = rate_limiter.limit("read")
+write_limit = rate_limiter.limit("write")
+search_limit = rate_limiter.limit("search")
@@ -0,0 +1,19 @@
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.metrics import TimedRedis
+
+# One connection pool per worker, shared by the auth user cache, the rate limiter and the job queue
+pool = redis.ConnectionPool(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
+                            decode_responses=True)
+redis_client = TimedRedis(connection_pool=pool)
+
+
+async def close_redis():
+    """
+    The close_redis function closes the shared client and disconnects every connection of the pool.
+
+    :return: None
+    """
+    await redis_client.close()
+    await pool.disconnect()
@@ -0,0 +1,156 @@
+import os
+from hashlib import blake2b
+from typing import Awaitable, Callable
+from urllib.parse import urlencode
+
+import orjson
+from dotenv import load_dotenv
+from fastapi import Request, Response, status
+from pydantic import BaseModel
+
+from src.services.metrics import RESPONSE_CACHE, route_label
+from src.services.redis_pool import redis_client
+
+load_dotenv()
+
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+# Bump when the entry format changes: old entries then miss instead of being misread
+RESPONSE_CACHE_VERSION = 1
+
+
+def render(model: type[BaseModel], content, exclude_unset: bool = False) -> bytes:
+    """
+    The render function serializes what a route returns the way its response_model would.
+        ORM objects go through from_orm, dicts (rows of selected columns) through parse_obj.
+
+    :param model: type[BaseModel]: The response model
+    :param content: An object or dict, or a list of them
+    :param exclude_unset: bool: Leave out the fields that were not set, as response_model_exclude_unset does
+    :return: The JSON body
+    """
+    def encode(item):
+        parsed = model.parse_obj(item) if isinstance(item, dict) else model.from_orm(item)
+        return parsed.dict(exclude_unset=exclude_unset)
+
+    if isinstance(content, list):
+        return orjson.dumps([encode(item) for item in content])
+    return orjson.dumps(encode(content))
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    The etag_matches function tells whether an If-None-Match header names the etag.
+
+    :param if_none_match: str | None: The header value, a list of etags or *
+    :param etag: str: The current etag of the response
+    :return: True if the client's copy is still valid
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ResponseCache:
+    """
+    Caches the JSON bodies of read endpoints per user in Redis.
+        Every user has a version counter; an entry records the version it was built at and is only served
+        while the counter has not moved. Writes to a user's contacts bump the counter (invalidate), which
+        drops every cached response of that user at once without looking any key up.
+        The counter and the entry are read with one MGET. Stale entries are never deleted, they expire after ttl.
+        Each entry carries a strong ETag (a hash of the body), so a client sending it back in If-None-Match
+        gets a 304 without the body being rebuilt or sent.
+    """
+
+    def __init__(self, redis, ttl: int = RESPONSE_CACHE_TTL):
+        self.redis = redis
+        self.ttl = ttl
+
+    @staticmethod
+    def version_key(user_id: int) -> str:
+        return f"resp:v{RESPONSE_CACHE_VERSION}:{user_id}:version"
+
+    @staticmethod
+    def entry_key(user_id: int, path: str, params: list[tuple[str, str]]) -> str:
+        return f"resp:v{RESPONSE_CACHE_VERSION}:{user_id}:{path}?{urlencode(sorted(params))}"
+
+    async def get(self, user_id: int, path: str, params: list[tuple[str, str]]) -> tuple[int, dict | None]:
+        """
+        The get function reads the user's version and the cached entry in one round trip.
+
+        :param user_id: int: The owner of the response
+        :param path: str: The request path
+        :param params: list[tuple[str, str]]: The parameters the response depends on
+        :return: The current version and the entry, None if missing or built at an older version
+        """
+        version, raw = await self.redis.mget(self.version_key(user_id), self.entry_key(user_id, path, params))
+        version = int(version or 0)
+        if raw is None:
+            return version, None
+        meta, _, body = raw.partition("\n")
+        entry = orjson.loads(meta)
+        if entry.get("version") != version:
+            return version, None
+        entry["body"] = body
+        return version, entry
+
+    async def set(self, user_id: int, path: str, params: list[tuple[str, str]], version: int, body: bytes,
+                  headers: dict[str, str]) -> str:
+        """
+        The set function stores a response built at version.
+            If a write bumped the version in the meantime the entry is never served.
+
+        :param user_id: int: The owner of the response
+        :param path: str: The request path
+        :param params: list[tuple[str, str]]: The parameters the response depends on
+        :param version: int: The version read before the response was built
+        :param body: bytes: The JSON body
+        :param headers: dict[str, str]: Headers to send with the body
+        :return: The etag of the body
+        """
+        etag = f'"{blake2b(body, digest_size=16).hexdigest()}"'
+        meta = orjson.dumps({"version": version, "etag": etag, "headers": headers})
+        await self.redis.set(self.entry_key(user_id, path, params), meta + b"\n" + body, ex=self.ttl)
+        return etag
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        The invalidate function drops every cached response of the user by bumping their version.
+
+        :param user_id: int: The user whose data changed
+        :return: None
+        """
+        await self.redis.incr(self.version_key(user_id))
+
+    async def respond(self, request: Request, user_id: int,
+                      build: Callable[[], Awaitable[tuple[bytes, dict[str, str]]]],
+                      extra: dict[str, str] | None = None) -> Response:
+        """
+        The respond function answers a GET from the cache, building and storing the response on a miss.
+            Exceptions raised by build, e.g. a 404 HTTPException, go through and are not cached.
+
+        :param request: Request: The request, its path and query parameters are the cache key
+        :param user_id: int: The owner of the response
+        :param build: Callable: Returns the JSON body and extra headers
+        :param extra: dict[str, str] | None: Other values the response depends on, e.g. today's date
+        :return: A 200 response with the body or a 304 response
+        """
+        route = route_label(request)
+        params = request.query_params.multi_items() + list((extra or {}).items())
+        version, entry = await self.get(user_id, request.url.path, params)
+        if entry is None:
+            outcome = "miss"
+            body, headers = await build()
+            etag = await self.set(user_id, request.url.path, params, version, body, headers)
+        else:
+            outcome = "hit"
+            body, headers, etag = entry["body"], entry["headers"], entry["etag"]
+        headers = {**headers, "ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            RESPONSE_CACHE.labels(route, "not_modified").inc()
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        RESPONSE_CACHE.labels(route, outcome).inc()
+        return Response(body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache(redis_client)
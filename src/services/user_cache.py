@@ -0,0 +1,48 @@
+import orjson
+
+from src.database.models import User
+
+# Bump when CACHED_USER_FIELDS or their meaning changes: old entries then miss instead of being misread
+USER_CACHE_VERSION = 1
+CACHED_USER_FIELDS = ("id", "username", "email", "avatar", "confirmed")
+
+
+def user_cache_key(email: str) -> str:
+    """
+    The user_cache_key function returns the Redis key of the cached user record.
+    The schema version is part of the key, so a deploy that changes the format never reads old entries.
+
+    :param email: str: The email of the user
+    :return: The cache key
+    """
+    return f"user:v{USER_CACHE_VERSION}:{email}"
+
+
+def dump_user(user: User) -> bytes:
+    """
+    The dump_user function serializes the fields auth needs into a small JSON document.
+    Unlike pickling the ORM instance it carries no SQLAlchemy state and no password hash.
+
+    :param user: User: The user loaded from the database
+    :return: The encoded record
+    """
+    record = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+    record["v"] = USER_CACHE_VERSION
+    return orjson.dumps(record)
+
+
+def load_user(data: bytes) -> User | None:
+    """
+    The load_user function rebuilds a transient User from a record made by dump_user.
+    Records of another version or that can't be decoded are treated as a cache miss.
+
+    :param data: bytes: The encoded record
+    :return: A User that is not attached to any session, or None
+    """
+    try:
+        record = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(record, dict) or record.pop("v", None) != USER_CACHE_VERSION:
+        return None
+    return User(**record)
@@ -1,12 +1,20 @@
 
+import fakeredis
+import fakeredis.aioredis
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app
 from src.database.models import Base
 from src.database.connect import get_db
+from src.services.auth import auth_service
+from src.services.jobs import job_queue
+from src.services.rate_limit import rate_limiter
+from src.services.response_cache import response_cache
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -16,6 +24,10 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The app talks to the same file through aiosqlite; NullPool keeps connections off the TestClient event loops
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -35,15 +47,21 @@ def session():
 def client(session):
     # Dependency override
 
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
-
-    yield TestClient(app)
+    auth_service.r = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    job_queue.redis = auth_service.r
+    response_cache.redis = auth_service.r
+    rate_limiter.redis = auth_service.r
+    rate_limiter.leases.clear()
+    auth_service.user_cache.clear()
+
+    # One event loop for the whole module, the fake Redis connections are bound to the loop that opened them
+    with TestClient(app) as test_client:
+        yield test_client
 
 
 @pytest.fixture(scope="module")
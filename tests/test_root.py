@@ -8,4 +8,14 @@ client = TestClient(main.app)
 def test_root():
     response = client.get("/")
     assert response.status_code == 200
-    assert response.json() == {"message": "Hello"}
\ No newline at end of file
+    assert response.json() == {"message": "Hello"}
+
+def test_metrics():
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",route="/"}' in response.text
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in response.text
+    assert "db_pool_checked_out" in response.text
+    assert "# TYPE user_cache_hits_total counter" in response.text
+    assert "hashing_pool_rejected_total " in response.text
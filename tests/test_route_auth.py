@@ -1,4 +1,6 @@
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
+
+from redis.exceptions import ConnectionError as RedisConnectionError
 
 from src.database.models import User
 from src.services.messages import ALREADY_EXISTS, EMAIL_NOT_CONFIRMED, INVALID_PASSWORD, INVALID_EMAIL
@@ -6,8 +8,8 @@ from src.services.urls_const import URL_SIGNUP, URL_LOGIN
 
 
 def test_create_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    mock_queue_email = AsyncMock()
+    monkeypatch.setattr("src.routes.auth.queue_confirmation_email", mock_queue_email)
     response = client.post(
         URL_SIGNUP,
         json=user,
@@ -16,6 +18,20 @@ def test_create_user(client, user, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    mock_queue_email.assert_awaited_once()
+    assert mock_queue_email.await_args.args[0] == user.get("email")
+
+
+def test_create_user_when_the_queue_is_down(client, monkeypatch):
+    mock_queue_email = AsyncMock(side_effect=RedisConnectionError("Connection refused"))
+    monkeypatch.setattr("src.routes.auth.queue_confirmation_email", mock_queue_email)
+    response = client.post(
+        URL_SIGNUP,
+        json={"username": "cable", "email": "cable@example.com", "password": "123456789"},
+    )
+    assert response.status_code == 201, response.text
+    assert response.json()["user"]["email"] == "cable@example.com"
+    mock_queue_email.assert_awaited_once()
 
 
 def test_repeat_create_user(client, user):
@@ -1,17 +1,19 @@
-from unittest.mock import MagicMock, patch
+import json
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
 from src.database.models import User
 from src.services.auth import auth_service
-from src.services.messages import NOT_FOUND
+from src.services.messages import NOT_FOUND, INVALID_JSON, INVALID_BULK_BODY, DUPLICATE_EMAIL
 from src.services.urls_const import URL_SIGNUP, URL_LOGIN
 
 
 @pytest.fixture()
 def token(client, user, session, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    mock_queue_email = AsyncMock()
+    monkeypatch.setattr("src.routes.auth.queue_confirmation_email", mock_queue_email)
     client.post(URL_SIGNUP, json=user)
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
@@ -25,7 +27,7 @@ def token(client, user, session, monkeypatch):
 
 def test_get_contacts_not_found(client, token):
     with patch.object(auth_service, 'r') as r_mock:
-        r_mock.get.return_value = None
+        r_mock.get = AsyncMock(return_value=None)
         response = client.get(
             "/api/contacts",
             headers={"Authorization": f"Bearer {token}"}
@@ -33,3 +35,90 @@ def test_get_contacts_not_found(client, token):
         assert response.status_code == 404, response.text
         data = response.json()
         assert data["detail"] == NOT_FOUND
+
+
+def test_list_endpoints_birthday_format(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    # A leap year, so the birthday exists whatever tomorrow is
+    birthday = (date.today() + timedelta(days=1)).replace(year=1992)
+    response = client.post("/api/contacts/create", headers=headers,
+                           json={"name": "Wade", "surname": "Wilson", "email": "wade.wilson@example.com",
+                                 "phone": "+380501112233", "birthday": birthday.isoformat(),
+                                 "additionally": "Merc with a mouth"})
+    assert response.status_code == 201, response.text
+    contact = response.json()
+    assert contact["birthday"] == birthday.isoformat()
+    for url in ("/api/contacts/all", "/api/contacts/bday", "/api/contacts/searchWilson"):
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        assert [row for row in response.json() if row["id"] == contact["id"]] == [contact], url
+
+
+def test_get_contacts_pages_to_the_end(client, token):
+    headers = {"Authorization": f"Bearer {token}", "Origin": "http://localhost:3000"}
+    for number in range(5):
+        response = client.post("/api/contacts/create", headers=headers,
+                               json={"name": "Page", "surname": f"Contact{number}",
+                                     "email": f"page{number}@example.com", "phone": f"+38050200000{number}",
+                                     "birthday": "1990-05-17", "additionally": "Paged"})
+        assert response.status_code == 201, response.text
+    expected = [contact["id"] for contact in client.get("/api/contacts/all", headers=headers).json()]
+    assert len(expected) >= 5
+
+    ids, params, pages = [], {"limit": 2}, 0
+    while True:
+        response = client.get("/api/contacts/all", headers=headers, params=params)
+        assert response.status_code == 200, response.text
+        exposed = response.headers["Access-Control-Expose-Headers"]
+        assert "X-Next-Cursor" in exposed and "ETag" in exposed
+        ids += [contact["id"] for contact in response.json()]
+        pages += 1
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert ids == expected
+    assert pages == (len(expected) + 1) // 2
+
+
+def bulk_row(number: int, **overrides) -> dict:
+    row = {"name": "Bulk", "surname": f"Row{number}", "email": f"bulk{number}@example.com",
+           "phone": f"+38050300{number:04d}", "birthday": "1985-07-01", "additionally": "Imported"}
+    row.update(overrides)
+    return row
+
+
+def test_bulk_json_array(client, token, monkeypatch):
+    monkeypatch.setattr("src.routes.contacts.BULK_CHUNK_SIZE", 3)
+    rows = [bulk_row(number) for number in range(7)]
+    rows[2]["email"] = "not an email"
+    rows[4]["email"] = rows[0]["email"]
+    response = client.post("/api/contacts/bulk", headers={"Authorization": f"Bearer {token}"}, json=rows)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert (data["created"], data["failed"]) == (5, 2)
+    assert [error["index"] for error in data["errors"]] == [2, 4]
+    assert data["errors"][0]["detail"][0]["loc"] == ["email"]
+    assert data["errors"][1]["detail"] == DUPLICATE_EMAIL
+
+
+def test_bulk_ndjson(client, token, monkeypatch):
+    monkeypatch.setattr("src.routes.contacts.BULK_CHUNK_SIZE", 2)
+    lines = [json.dumps(bulk_row(number)) for number in range(10, 15)]
+    lines.insert(3, "{broken")
+    lines.insert(5, "")
+    body = "\n".join(lines) + "\n"
+    response = client.post("/api/contacts/bulk", content=body,
+                           headers={"Authorization": f"Bearer {token}", "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    # The blank line is skipped, so the rows after it are indexed as if it were not there
+    assert response.json() == {"created": 5, "failed": 1, "errors": [{"index": 3, "detail": INVALID_JSON}]}
+
+
+def test_bulk_invalid_body(client, token):
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    response = client.post("/api/contacts/bulk", headers=headers, content="[{")
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == INVALID_JSON
+    response = client.post("/api/contacts/bulk", headers=headers, json=bulk_row(20))
+    assert response.status_code == 422, response.text
+    assert response.json()["detail"] == INVALID_BULK_BODY
@@ -0,0 +1,36 @@
+import unittest
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.pool_metrics import MeteredAsyncQueuePool, pool_metrics, pool_status
+
+
+class TestPoolMetrics(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        pool_metrics.reset()
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=MeteredAsyncQueuePool,
+                                          pool_size=1, max_overflow=0, pool_timeout=0.1)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_checkouts_are_counted(self):
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            status = pool_status(self.engine)
+            self.assertEqual(status["checked_out"], 1)
+        status = pool_status(self.engine)
+        self.assertEqual((status["size"], status["checked_out"], status["checkouts"]), (1, 0, 1))
+
+    async def test_timeouts_are_counted(self):
+        async with self.engine.connect():
+            with self.assertRaises(exc.TimeoutError):
+                async with self.engine.connect():
+                    pass
+        self.assertEqual(pool_status(self.engine)["timeouts"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.query_stats import count_queries, fingerprint, track_queries
+
+
+class TestQueryStats(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        track_queries(self.engine)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_count_queries(self):
+        observed = REGISTRY.get_sample_value("db_query_duration_seconds_count", {"operation": "SELECT"}) or 0
+        async with self.engine.connect() as conn:
+            with count_queries() as stats:
+                for value in range(3):
+                    await conn.execute(text("SELECT :value"), {"value": value})
+            await conn.execute(text("SELECT 1"))
+        self.assertEqual(stats.count, 3)
+        self.assertGreater(stats.duration, 0)
+        self.assertEqual(stats.fingerprints.most_common(1)[0][1], 3)
+        # The same hooks feed the latency histogram, for every statement
+        self.assertEqual(REGISTRY.get_sample_value("db_query_duration_seconds_count", {"operation": "SELECT"}),
+                         observed + 4)
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint("SELECT *\n  FROM contacts WHERE id = 5 AND email IN (?, ?, ?) AND name = 'x'"),
+                         "SELECT * FROM contacts WHERE id = ? AND email IN (...) AND name = ?")
+        self.assertEqual(fingerprint("SELECT * FROM users WHERE users.email = $1::VARCHAR"),
+                         "SELECT * FROM users WHERE users.email = ?::VARCHAR")
+
+
+if __name__ == '__main__':
+    unittest.main()
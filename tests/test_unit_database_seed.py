@@ -0,0 +1,55 @@
+import unittest
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Contact, User, CONTACTS_FTS
+from src.database.seed import generate_contacts, generate_users, seed
+
+
+class TestSeed(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://", poolclass=StaticPool)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_generate_contacts_is_deterministic(self):
+        batch = generate_contacts(0, 50, [7, 8], seed=3)
+        self.assertEqual(batch, generate_contacts(0, 50, [7, 8], seed=3))
+        self.assertNotEqual(batch, generate_contacts(0, 50, [7, 8], seed=4))
+        self.assertEqual([row["user_id"] for row in batch[:4]], [7, 8, 7, 8])
+        self.assertEqual(len({row["email"] for row in batch}), 50)
+        self.assertEqual(len({row["phone"] for row in batch}), 50)
+
+    def test_generate_users(self):
+        users = generate_users(5, seed=1, password_hash="hash")
+        self.assertEqual(len({user["email"] for user in users}), 5)
+        self.assertTrue(all(user["password"] == "hash" and user["confirmed"] for user in users))
+
+    def test_seed(self):
+        user_ids = seed(self.engine, contacts=250, users=3, batch_size=100, seed=5, reset=True)
+        self.assertEqual(len(user_ids), 3)
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.scalar(select(func.count()).select_from(User)), 3)
+            owners = connection.execute(select(Contact.user_id, func.count()).group_by(Contact.user_id)).all()
+            self.assertEqual(sorted(count for _, count in owners), [83, 83, 84])
+            surname = connection.scalar(select(Contact.surname).filter(Contact.id == 1))
+            matches = connection.scalar(text(f"SELECT count(*) FROM {CONTACTS_FTS} WHERE {CONTACTS_FTS} MATCH :q"),
+                                        {"q": f'"{surname}"'})
+            self.assertGreaterEqual(matches, 1)
+            names = connection.execute(text("SELECT name FROM sqlite_master WHERE tbl_name = 'contacts'")).scalars()
+            self.assertTrue({"contacts_fts_ai", "ix_contacts_user_id_birthday_ordinal_id"} <= set(names))
+            birthdays = connection.execute(select(Contact.birthday, Contact.birthday_ordinal)).all()
+            self.assertTrue(all(ordinal == birthday.month * 100 + birthday.day for birthday, ordinal in birthdays))
+
+    def test_seed_needs_users(self):
+        with self.assertRaises(ValueError):
+            seed(self.engine, contacts=10, users=0)
+        with self.assertRaises(ValueError):
+            seed(self.engine, contacts=10, users=1, batch_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
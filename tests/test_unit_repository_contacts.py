@@ -1,19 +1,23 @@
 import unittest
 from datetime import date, timedelta, datetime
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
-from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, Contact
-from src.repository.contacts import create_contact, get_contact, update_contact, remove_contact, birthday_list, \
-    get_contacts, searcher
-from src.schemas import ContactModel
+from src.database.models import User, Contact, birthday_ordinal
+from src.repository.contacts import create_contact, create_contacts, get_contact, update_contact, patch_contact, \
+    remove_contact, birthday_list, \
+    get_contacts, searcher, EXPORT_FIELDS
+from src.schemas import ContactModel, ContactUpdateModel
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
         self.user = User(id=1)
 
     async def test_create_contact(self):
@@ -34,21 +38,53 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.additionally, body.additionally)
         self.assertTrue(hasattr(result, "id"))
 
+    async def test_create_contacts(self):
+        bodies = [ContactModel(name="John", surname="Doe", email=f"john{i}@example.com", phone=f"123456789{i}",
+                               birthday=date.today(), additionally="Additional info") for i in range(4)]
+        bodies[3].email = bodies[2].email
+        self.result.all.return_value = [("john0@example.com", "0000000")]
+        self.result.scalars.return_value.all.return_value = [10, 11]
+        result = await create_contacts(bodies=bodies, user=self.user, db=self.session)
+        self.assertEqual(result, ["email", 10, 11, "email"])
+        rows = self.session.execute.call_args.args[1]
+        self.assertEqual([row["email"] for row in rows], ["john1@example.com", "john2@example.com"])
+        self.assertTrue(all(row["user_id"] == self.user.id for row in rows))
+        self.session.commit.assert_awaited_once()
+
     async def test_get_contact(self):
         contact = Contact()
-        self.session.query(Contact).filter.return_value.first.return_value = contact
+        self.result.scalars.return_value.first.return_value = contact
         result = await get_contact(contact.id, self.user, self.session)
         self.assertEqual(result, contact)
 
     async def test_get_contacts(self):
         contacts = [Contact(user_id=1), Contact(user_id=1), Contact(user_id=1)]
-        self.session.query().filter().all.return_value = contacts
+        self.result.scalars.return_value.all.return_value = contacts
         result = await get_contacts(user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_page(self):
+        self.result.mappings.return_value.all.return_value = [{"id": 5, "name": "John"}]
+        result = await get_contacts(user=self.user, db=self.session, limit=10, after_id=4, fields=["name"])
+        self.assertEqual(result, [{"id": 5, "name": "John"}])
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual([column.name for column in statement.selected_columns], ["id", "name"])
+        self.assertIn("contacts.id >", str(statement))
+        self.assertIn("LIMIT", str(statement))
+
+    async def test_get_contacts_rows(self):
+        row = {"id": 5, "name": "John", "surname": "Doe", "email": "john@example.com", "phone": "+380501234567",
+               "birthday": date(1990, 1, 2), "additionally": ""}
+        self.result.mappings.return_value.all.return_value = [row]
+        result = await get_contacts(user=self.user, db=self.session, rows=True)
+        self.assertEqual(result, [row])
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual(tuple(column.name for column in statement.selected_columns), EXPORT_FIELDS)
+        self.assertIn("date(contacts.birthday) AS birthday", str(statement))
+
     async def test_get_contact_not_found(self):
         contact = Contact()
-        self.session.query(Contact).filter.return_value.first.return_value = None
+        self.result.scalars.return_value.first.return_value = None
         result = await get_contact(contact.id, self.user, self.session)
         self.assertIsNone(result)
 
@@ -64,7 +100,8 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         )
         contact = Contact(id=contact_id, name="Jane", surname="Doe", email="janedoe@example.com", phone="0987654321",
                           birthday=date.today(), additionally="Old info")
-        self.session.query(Contact).filter.return_value.first.return_value = contact
+        self.result.scalars.return_value.first.return_value = contact
+        self.session.get_bind.return_value.dialect.update_returning = False
         result = await update_contact(body, contact_id, self.user, self.session)
         self.assertEqual(result.name, body.name)
         self.assertEqual(result.surname, body.surname)
@@ -74,39 +111,117 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.additionally, body.additionally)
         self.assertTrue(hasattr(result, "id"))
 
+    async def test_update_contact_returning(self):
+        body = ContactModel(name="John", surname="Doe", email="johndoe@example.com", phone="1234567890",
+                            birthday=date(1990, 3, 14), additionally="Additional info")
+        contact = Contact(id=1, name="John")
+        self.result.scalars.return_value.first.return_value = contact
+        self.session.get_bind.return_value.dialect.update_returning = True
+        result = await update_contact(body, 1, self.user, self.session)
+        self.assertEqual(result, contact)
+        self.session.execute.assert_awaited_once()
+        statement = self.session.execute.call_args.args[0]
+        self.assertTrue(str(statement).startswith("UPDATE contacts SET"))
+        self.assertIn("RETURNING", str(statement))
+        self.assertNotIn("birthday_ordinal", statement.compile().params)
+
+    async def test_patch_contact(self):
+        self.session.get_bind.return_value.dialect.update_returning = True
+        await patch_contact(ContactUpdateModel(phone="1234567890"), 1, self.user, self.session)
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual(set(statement.compile().params) - {"id_1", "user_id_1"}, {"phone"})
+
+    async def test_patch_contact_rejects_null(self):
+        with self.assertRaises(ValidationError):
+            ContactUpdateModel(name=None)
+
     async def test_remove_contact(self):
         contact_id = 1
         contact = Contact(id=contact_id)
-        self.session.query(Contact).filter.return_value.first.return_value = contact
+        self.result.scalars.return_value.first.return_value = contact
         result = await remove_contact(contact_id, self.user, self.session)
         self.assertEqual(result, contact)
+        self.assertTrue(str(self.session.execute.call_args.args[0]).startswith("DELETE FROM contacts"))
+
+    async def test_remove_contact_without_returning(self):
+        contact = Contact(id=1)
+        self.result.scalars.return_value.first.return_value = contact
+        self.session.get_bind.return_value.dialect.delete_returning = False
+        result = await remove_contact(1, self.user, self.session)
+        self.assertEqual(result, contact)
+        self.session.delete.assert_awaited_once_with(contact)
 
     async def test_get_birthday_list(self):
         contacts = [Contact(birthday=datetime.now() + timedelta(days=1)),
                     Contact(birthday=datetime.now() + timedelta(days=2)),
                     Contact(birthday=datetime.now() + timedelta(days=3)),
-                    Contact(birthday=datetime.now() + timedelta(days=4)),
-                    Contact(birthday=datetime.now() + timedelta(days=5)),
-                    Contact(birthday=datetime.now() + timedelta(days=6)),
-                    Contact(birthday=datetime.now() + timedelta(days=7)),
-                    Contact(birthday=datetime.now() + timedelta(days=8)),
-                    Contact(birthday=datetime.now() + timedelta(days=9)),
-                    Contact(birthday=datetime.now() + timedelta(days=10)),
                     ]
-        self.session.query().all.return_value = contacts
-        result = await birthday_list(db=self.session)
-        self.assertEqual(result, contacts[0:7])
+        self.result.scalars.return_value.all.return_value = contacts
+        result = await birthday_list(user=self.user, db=self.session)
+        self.assertEqual(result, contacts)
+        statement = str(self.session.execute.call_args.args[0])
+        self.assertIn("contacts.user_id", statement)
+        self.assertIn("contacts.birthday_ordinal", statement)
+
+    async def birthday_ordinals(self, today: date, days: int) -> list[int]:
+        with patch("src.repository.contacts.date") as date_mock:
+            date_mock.today.return_value = today
+            await birthday_list(user=self.user, db=self.session, days=days)
+        params = self.session.execute.call_args.args[0].compile().params
+        return sorted(v for k, v in params.items() if k.startswith("birthday_ordinal"))
+
+    async def test_get_birthday_list_window(self):
+        self.assertEqual(await self.birthday_ordinals(date(2023, 5, 10), 7), [510, 516])
+        self.assertEqual(await self.birthday_ordinals(date(2023, 5, 10), 1), [510, 510])
+
+    async def test_get_birthday_list_year_wrap(self):
+        self.assertEqual(await self.birthday_ordinals(date(2023, 12, 29), 7), [104, 1229])
+
+    async def test_get_birthday_list_no_days(self):
+        result = await birthday_list(user=self.user, db=self.session, days=0)
+        self.assertEqual(result, [])
+        self.session.execute.assert_not_called()
+
+    async def test_get_birthday_list_leap_day(self):
+        # 29 February birthdays are celebrated on 28 February in common years
+        self.assertEqual(await self.birthday_ordinals(date(2023, 2, 22), 7), [222, 228, 229])
+        self.assertEqual(await self.birthday_ordinals(date(2022, 3, 1), 365), [228, 229, 301])
+        self.assertEqual(await self.birthday_ordinals(date(2022, 12, 1), 90), [228, 229, 1201])
+        # A leap year has its own 29 February
+        self.assertEqual(await self.birthday_ordinals(date(2024, 2, 22), 7), [222, 228])
+        self.assertEqual(await self.birthday_ordinals(date(2023, 3, 1), 365), [228, 301])
+        self.assertEqual(await self.birthday_ordinals(date(2023, 3, 1), 366), [])
+
+    async def test_get_birthday_list_rows(self):
+        self.result.mappings.return_value.all.return_value = [{"id": 1, "name": "John"}]
+        result = await birthday_list(user=self.user, db=self.session, rows=True)
+        self.assertEqual(result, [{"id": 1, "name": "John"}])
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual(tuple(column.name for column in statement.selected_columns), EXPORT_FIELDS)
+
+    def test_birthday_ordinal(self):
+        self.assertEqual(birthday_ordinal(date(2000, 2, 29)), 229)
+        self.assertEqual(birthday_ordinal(datetime(1990, 12, 31)), 1231)
 
     async def test_searcher(self):
         contact1 = Contact(name='John', surname='Doe', email='john.doe@example.com')
         contact2 = Contact(name='Jane', surname='Doe', email='jane.doe@example.com')
         contact3 = Contact(name='Alice', surname='Smith', email='alice.smith@example.com')
-        self.session.query.return_value.all.return_value = [contact1, contact2, contact3]
-        results = await searcher('Doe', self.session)
+        self.result.scalars.return_value.all.return_value = [contact1, contact2]
+        results = await searcher('Doe', self.user, self.session)
 
         assert contact1 in results
         assert contact2 in results
         assert contact3 not in results
+        statement = str(self.session.execute.call_args.args[0])
+        self.assertIn("contacts.user_id", statement)
+
+    async def test_searcher_rows(self):
+        self.result.mappings.return_value.all.return_value = [{"id": 1, "surname": "Doe"}]
+        results = await searcher('Doe', self.user, self.session, rows=True)
+        self.assertEqual(results, [{"id": 1, "surname": "Doe"}])
+        statement = self.session.execute.call_args.args[0]
+        self.assertEqual(tuple(column.name for column in statement.selected_columns), EXPORT_FIELDS)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,82 @@
+import unittest
+from datetime import date
+
+from src.database.models import Base, Contact, User
+from src.repository.contacts import searcher, patch_contact, remove_contact
+from src.schemas import ContactUpdateModel
+from tests.conftest import engine, TestingSessionLocal, TestingAsyncSessionLocal
+
+
+class TestSearcherSQLite(unittest.IsolatedAsyncioTestCase):
+    """searcher against the SQLite file the suite uses, so the FTS5 table, its triggers and the ILIKE
+    fallback run for real."""
+
+    def setUp(self):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        self.user, self.other = User(id=1), User(id=2)
+        contacts = [
+            ("John", "Smith", "john.smith@example.com", 1),
+            ("Olga", "Brown", "olga@example.com", 1),
+            ("Sale", "Half50%off", "sale@example.com", 1),
+            ("Max", "Under_score", "max@example.com", 1),
+            ("Sean", 'O"Neil', "sean@example.com", 1),
+            ("Jane", "Smith", "jane.smith@example.com", 2),
+        ]
+        with TestingSessionLocal() as db:
+            db.add_all([User(id=1, email="one@example.com", password="secret"),
+                        User(id=2, email="two@example.com", password="secret")])
+            db.add_all([Contact(name=name, surname=surname, email=email, phone=f"+38050000000{number}",
+                                birthday=date(1990, 1, number + 1), additionally="note", user_id=user_id)
+                        for number, (name, surname, email, user_id) in enumerate(contacts)])
+            db.commit()
+
+    async def search(self, part: str, user: User = None) -> list[str]:
+        async with TestingAsyncSessionLocal() as db:
+            contacts = await searcher(part, user or self.user, db)
+        return [contact.surname for contact in contacts]
+
+    async def test_fts(self):
+        self.assertEqual(await self.search("mit"), ["Smith"])
+        self.assertEqual(await self.search("OLGA@EX"), ["Brown"])
+        self.assertEqual(await self.search("nowhere"), [])
+
+    async def test_short_term_uses_ilike(self):
+        self.assertEqual(await self.search("ow"), ["Brown"])
+        self.assertEqual(await self.search("SM"), ["Smith"])
+
+    async def test_wildcards_are_literal(self):
+        self.assertEqual(await self.search("0%"), ["Half50%off"])
+        self.assertEqual(await self.search("%%"), [])
+        self.assertEqual(await self.search("r_"), ["Under_score"])
+        self.assertEqual(await self.search("__"), [])
+        self.assertEqual(await self.search("50%off"), ["Half50%off"])
+        self.assertEqual(await self.search("r_sc"), ["Under_score"])
+
+    async def test_quotes_are_literal(self):
+        self.assertEqual(await self.search('O"N'), ['O"Neil'])
+        self.assertEqual(await self.search('"Ne'), ['O"Neil'])
+        self.assertEqual(await self.search('O"'), ['O"Neil'])
+        self.assertEqual(await self.search('"""'), [])
+
+    async def test_scoped_to_user(self):
+        self.assertEqual(await self.search("jane"), [])
+        async with TestingAsyncSessionLocal() as db:
+            contacts = await searcher("smith", self.other, db)
+        self.assertEqual([contact.name for contact in contacts], ["Jane"])
+
+    async def test_fts_follows_update_and_delete(self):
+        async with TestingAsyncSessionLocal() as db:
+            body = ContactUpdateModel(surname="Jones", email="john.jones@example.com")
+            contact = await patch_contact(body, 1, self.user, db)
+        self.assertEqual(contact.surname, "Jones")
+        self.assertEqual(await self.search("Smith"), [])
+        self.assertEqual(await self.search("Jones"), ["Jones"])
+        async with TestingAsyncSessionLocal() as db:
+            await remove_contact(1, self.user, db)
+        self.assertEqual(await self.search("Jones"), [])
+        self.assertEqual(await self.search("smith", self.other), ["Smith"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,19 @@
 import unittest
 from unittest.mock import MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
-from src.repository.users import create_user, get_user_by_email, confirmed_email
+from src.repository.users import create_user, get_user_by_email, confirmed_email, update_password
 from src.schemas import UserModel
 
 
 class TestUser(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
         self.body = UserModel(
             username="Vitalii",
             email="vitalii@email.com",
@@ -29,12 +31,12 @@ class TestUser(unittest.IsolatedAsyncioTestCase):
     async def test_get_user_by_email(self):
         body = self.body
         user = User(email=body.email)
-        self.session.query().filter().first.return_value = user
+        self.result.scalars.return_value.first.return_value = user
         result = await get_user_by_email(email=user.email, db=self.session)
         self.assertEqual(result, user)
 
     async def test_get_user_by_email_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.result.scalars.return_value.first.return_value = None
         result = await get_user_by_email(email="fake_email@gmail.com", db=self.session)
         self.assertIsNone(result)
 
@@ -45,6 +47,12 @@ class TestUser(unittest.IsolatedAsyncioTestCase):
         result = await get_user_by_email(email=body.email, db=self.session)
         self.assertEqual(result.confirmed, True)
 
+    async def test_update_password(self):
+        user = User(email=self.body.email, password="old")
+        await update_password(user, "new", self.session)
+        self.assertEqual(user.password, "new")
+        self.session.commit.assert_awaited_once()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,78 @@
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import fakeredis
+import fakeredis.aioredis
+
+from src.database.models import User
+from src.services.auth import Auth
+from src.services.jwt_backend import BACKENDS, TokenError, get_jwt_backend
+from src.services.local_cache import LocalCache
+
+
+class TestAuthUserCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.auth = Auth()
+        self.auth.r = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        self.auth.user_cache = LocalCache(maxsize=8, ttl=60)
+        self.token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"})
+        self.user = User(id=1, username="deadpool", email="deadpool@example.com", confirmed=True)
+
+    async def test_local_cache_hit_skips_redis_and_db(self):
+        with patch("src.services.auth.repository_users.get_user_by_email", AsyncMock(return_value=self.user)) as get:
+            await self.auth.get_current_user(self.token, MagicMock())
+            self.auth.r = MagicMock()
+            user = await self.auth.get_current_user(self.token, MagicMock())
+        self.assertEqual(user.id, 1)
+        get.assert_awaited_once()
+        self.auth.r.get.assert_not_called()
+        self.assertEqual(self.auth.user_cache.stats()["hits"], 1)
+
+    async def test_invalidate_user(self):
+        with patch("src.services.auth.repository_users.get_user_by_email", AsyncMock(return_value=self.user)) as get:
+            await self.auth.get_current_user(self.token, MagicMock())
+            await self.auth.invalidate_user("deadpool@example.com")
+            await self.auth.get_current_user(self.token, MagicMock())
+        self.assertEqual(get.await_count, 2)
+
+
+class TestAuthTokens(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.auth = Auth()
+        self.auth.claims_cache = LocalCache(maxsize=8, ttl=300)
+
+    async def test_decode_token_is_cached(self):
+        token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"})
+        self.assertEqual(self.auth.decode_token(token)["sub"], "deadpool@example.com")
+        self.auth.jwt = MagicMock()
+        self.assertEqual(self.auth.decode_token(token)["sub"], "deadpool@example.com")
+        self.auth.jwt.decode.assert_not_called()
+
+    async def test_expired_cached_claims_are_rejected(self):
+        token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"}, expires_delta=60)
+        self.auth.decode_token(token)
+        with patch("src.services.auth.time.time", return_value=time.time() + 120):
+            with self.assertRaises(TokenError):
+                self.auth.decode_token(token)
+
+    async def test_invalid_token(self):
+        with self.assertRaises(TokenError):
+            self.auth.decode_token("not.a.token")
+        self.assertEqual(len(self.auth.claims_cache), 0)
+
+    async def test_backends_are_interchangeable(self):
+        token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"})
+        for name in BACKENDS:
+            try:
+                backend = get_jwt_backend(name)
+            except ImportError:
+                continue
+            claims = backend.decode(token, self.auth.SECRET_KEY, algorithms=[self.auth.ALGORITHM])
+            self.assertEqual(claims["scope"], "access_token")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from functools import partial
+from unittest.mock import patch
+
+import fakeredis
+import fakeredis.aioredis
+import httpx
+from libgravatar import Gravatar
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, User
+from src.services.avatar import AvatarService, avatar_url, fallback_avatar_url, verify_avatar
+from src.services.jobs import job_queue
+from src.services.user_cache import user_cache_key
+
+EMAIL = " Deadpool@Example.com "
+
+
+class TestAvatarService(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.session_factory() as db:
+            db.add(User(email=EMAIL, password="secret", avatar=avatar_url(EMAIL)))
+            await db.commit()
+        self.avatars = AvatarService(self.redis, self.session_factory, prefetch=True, timeout=1)
+        self.requests = []
+        self.status = 200
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def stored_avatar(self) -> str:
+        async with self.session_factory() as db:
+            return await db.scalar(select(User.avatar).filter(User.email == EMAIL))
+
+    def mock_gravatar(self):
+        def handler(request: httpx.Request):
+            self.requests.append(request)
+            if self.status is None:
+                raise httpx.ConnectTimeout("timed out", request=request)
+            return httpx.Response(self.status)
+        return patch("httpx.AsyncClient", partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+
+    def test_url_matches_libgravatar(self):
+        self.assertEqual(avatar_url(EMAIL), Gravatar(EMAIL).get_image())
+        self.assertEqual(avatar_url(EMAIL), avatar_url("deadpool@example.com"))
+
+    async def test_verify(self):
+        with self.mock_gravatar():
+            self.assertTrue(await self.avatars.verify(EMAIL))
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0].method, "HEAD")
+        self.assertEqual(self.requests[0].url.params["d"], "404")
+
+    async def test_verify_timeout(self):
+        self.status = None
+        with self.mock_gravatar():
+            self.assertIsNone(await self.avatars.verify(EMAIL))
+
+    async def test_verify_avatar_keeps_an_existing_image(self):
+        with self.mock_gravatar(), patch("src.services.avatar.avatar_service", self.avatars):
+            await verify_avatar(EMAIL)
+        self.assertEqual(await self.stored_avatar(), avatar_url(EMAIL))
+
+    async def test_verify_avatar_stores_the_fallback(self):
+        self.status = 404
+        await self.redis.set(user_cache_key(EMAIL), "cached user")
+        with self.mock_gravatar(), patch("src.services.avatar.avatar_service", self.avatars):
+            await verify_avatar(EMAIL)
+        self.assertEqual(await self.stored_avatar(), fallback_avatar_url(EMAIL))
+        self.assertEqual(fallback_avatar_url(EMAIL), avatar_url(EMAIL) + "?d=identicon")
+        self.assertIsNone(await self.redis.get(user_cache_key(EMAIL)))
+
+    async def test_fallback_does_not_replace_a_changed_avatar(self):
+        async with self.session_factory() as db:
+            user = await db.scalar(select(User).filter(User.email == EMAIL))
+            user.avatar = "https://res.cloudinary.com/avatar.png"
+            await db.commit()
+        self.assertFalse(await self.avatars.use_fallback(EMAIL))
+        self.assertEqual(await self.stored_avatar(), "https://res.cloudinary.com/avatar.png")
+
+    async def test_verify_avatar_job_raises_to_be_retried(self):
+        self.status = None
+        with self.mock_gravatar(), patch("src.services.avatar.avatar_service", self.avatars):
+            with self.assertRaises(TimeoutError):
+                await verify_avatar(EMAIL)
+
+    async def test_schedule_verify(self):
+        with patch.object(job_queue, "redis", self.redis):
+            self.assertIsNotNone(await self.avatars.schedule_verify(EMAIL))
+            self.assertIsNone(await self.avatars.schedule_verify(EMAIL))
+            self.avatars.prefetch = False
+            self.assertIsNone(await self.avatars.schedule_verify("other@example.com"))
+            self.assertEqual((await job_queue.depth())["ready"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from src.services.bulk import BulkFormatError, array_items, chunked, ndjson_items
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestBulk(unittest.IsolatedAsyncioTestCase):
+
+    async def test_ndjson_items_lines_split_across_chunks(self):
+        chunks = (b'{"name": "Jo', b'hn"}\n{"na', b'me": "Jane"}\n', b'\n', b'{"name": ', b'"Max"}')
+        items = [item async for item in ndjson_items(stream(*chunks))]
+        self.assertEqual(items, [{"name": "John"}, {"name": "Jane"}, {"name": "Max"}])
+
+    async def test_ndjson_items_invalid_line(self):
+        items = [item async for item in ndjson_items(stream(b'{"name": "John"}\nnot json\n  \n[1, 2]\n'))]
+        self.assertEqual(items[0], {"name": "John"})
+        self.assertIsInstance(items[1], BulkFormatError)
+        self.assertEqual(items[2], [1, 2])
+        self.assertEqual(len(items), 3)
+
+    async def test_chunked(self):
+        chunks = [chunk async for chunk in chunked(array_items(range(7)), 3)]
+        self.assertEqual(chunks, [[0, 1, 2], [3, 4, 5], [6]])
+
+
+if __name__ == '__main__':
+    unittest.main()
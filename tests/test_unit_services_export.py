@@ -0,0 +1,26 @@
+import unittest
+from datetime import datetime
+
+from src.services.export import ndjson_lines, csv_lines
+
+
+async def batches():
+    yield [{"id": 1, "name": "John", "birthday": datetime(1990, 1, 2)}]
+    yield [{"id": 2, "name": "Jane, Jr", "birthday": datetime(1991, 3, 4)}]
+
+
+class TestExport(unittest.IsolatedAsyncioTestCase):
+
+    async def test_ndjson_lines(self):
+        chunks = [chunk async for chunk in ndjson_lines(batches())]
+        self.assertEqual(chunks, ['{"id": 1, "name": "John", "birthday": "1990-01-02"}\n',
+                                  '{"id": 2, "name": "Jane, Jr", "birthday": "1991-03-04"}\n'])
+
+    async def test_csv_lines(self):
+        chunks = [chunk async for chunk in csv_lines(batches(), ("id", "name", "birthday"))]
+        self.assertEqual("".join(chunks).splitlines(),
+                         ["id,name,birthday", "1,John,1990-01-02", '2,"Jane, Jr",1991-03-04'])
+
+
+if __name__ == '__main__':
+    unittest.main()
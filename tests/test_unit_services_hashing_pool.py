@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from src.services.auth import Auth
+from src.services.hashing_pool import HashingPool, PoolOverloaded
+
+
+class TestHashingPool(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.pool = HashingPool(max_workers=1, max_queue=1)
+        self.release = threading.Event()
+
+    async def asyncTearDown(self):
+        self.release.set()
+        self.pool.shutdown()
+
+    async def test_run(self):
+        self.assertEqual(await self.pool.run(pow, 2, 10), 1024)
+        self.assertEqual(self.pool.stats(), {"workers": 1, "in_flight": 0, "queued": 0, "completed": 1,
+                                             "rejected": 0})
+
+    async def test_rejects_when_queue_is_full(self):
+        running = asyncio.ensure_future(self.pool.run(self.release.wait))
+        waiting = asyncio.ensure_future(self.pool.run(self.release.wait))
+        await asyncio.sleep(0)
+        self.assertEqual(self.pool.stats()["queued"], 1)
+        with self.assertRaises(PoolOverloaded):
+            await self.pool.run(self.release.wait)
+        self.release.set()
+        await asyncio.gather(running, waiting)
+        self.assertEqual(self.pool.stats()["rejected"], 1)
+
+    async def test_auth_answers_503_when_overloaded(self):
+        auth = Auth()
+        auth.hashing_pool = HashingPool(max_workers=1, max_queue=0)
+        blocker = asyncio.ensure_future(auth.hashing_pool.run(self.release.wait))
+        await asyncio.sleep(0)
+        with self.assertRaises(HTTPException) as e:
+            await auth.get_password_hash("123456789")
+        self.assertEqual(e.exception.status_code, 503)
+        self.assertIn("Retry-After", e.exception.headers)
+        self.release.set()
+        await blocker
+        auth.hashing_pool.shutdown()
+
+    async def test_hash_and_verify(self):
+        auth = Auth()
+        hashed = await auth.get_password_hash("123456789")
+        self.assertTrue(await auth.verify_password("123456789", hashed))
+        self.assertFalse(await auth.verify_password("wrong", hashed))
+        self.assertTrue(hashed.startswith("$argon2id$"))
+
+    async def test_bcrypt_hash_is_upgraded(self):
+        auth = Auth()
+        legacy = auth.pwd_context.handler("bcrypt").hash("123456789")
+        valid, new_hash = await auth.verify_and_update_password("123456789", legacy)
+        self.assertTrue(valid)
+        self.assertTrue(new_hash.startswith("$argon2id$"))
+        valid, new_hash = await auth.verify_and_update_password("123456789", new_hash)
+        self.assertEqual((valid, new_hash), (True, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock
+
+import fakeredis
+import fakeredis.aioredis
+import orjson
+
+from src.services.jobs import JobQueue
+
+
+class TestJobQueue(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        self.queue = JobQueue(self.redis, name="test", max_attempts=2, backoff=0, visibility_timeout=5)
+        self.handler = AsyncMock()
+        self.queue.task("greet")(self.handler)
+
+    async def run_one(self):
+        reserved = await self.queue.reserve(timeout=0.1)
+        self.assertIsNotNone(reserved)
+        return await self.queue.process(*reserved)
+
+    async def test_job_runs_and_is_acked(self):
+        job_id = await self.queue.enqueue("greet", name="Jane")
+        self.assertEqual((await self.queue.depth())["ready"], 1)
+        self.assertEqual(await self.run_one(), "done")
+        self.handler.assert_awaited_once_with(name="Jane")
+        self.assertEqual(await self.queue.depth(), {"ready": 0, "delayed": 0, "processing": 0, "dead": 0})
+        self.assertEqual(len(job_id), 32)
+
+    async def test_jobs_run_in_order(self):
+        for number in range(3):
+            await self.queue.enqueue("greet", number=number)
+        for _ in range(3):
+            await self.run_one()
+        self.assertEqual([call.kwargs["number"] for call in self.handler.await_args_list], [0, 1, 2])
+
+    async def test_idempotency_key(self):
+        self.assertIsNotNone(await self.queue.enqueue("greet", idempotency_key="jane", name="Jane"))
+        self.assertIsNone(await self.queue.enqueue("greet", idempotency_key="jane", name="Jane"))
+        self.assertEqual((await self.queue.depth())["ready"], 1)
+
+    async def test_failed_job_is_retried_then_dead_lettered(self):
+        self.handler.side_effect = RuntimeError("smtp down")
+        await self.queue.enqueue("greet", name="Jane")
+        self.assertEqual(await self.run_one(), "retry")
+        self.assertEqual((await self.queue.depth())["delayed"], 1)
+        self.assertEqual(await self.queue.promote(), 1)
+        self.assertEqual(await self.run_one(), "dead")
+        self.assertEqual(await self.queue.depth(), {"ready": 0, "delayed": 0, "processing": 0, "dead": 1})
+        dead = orjson.loads(await self.redis.lindex(self.queue.key("dead"), 0))
+        self.assertEqual((dead["attempts"], dead["error"]), (2, "RuntimeError('smtp down')"))
+
+        self.handler.side_effect = None
+        self.assertEqual(await self.queue.retry_dead(), 1)
+        self.assertEqual(await self.run_one(), "done")
+
+    async def test_unknown_job_is_dead_lettered(self):
+        await self.queue.enqueue("missing")
+        self.assertEqual(await self.run_one(), "dead")
+
+    async def test_expired_lease_is_requeued(self):
+        self.queue.visibility_timeout = -1
+        await self.queue.enqueue("greet", name="Jane")
+        await self.queue.reserve(timeout=0.1)
+        self.assertEqual((await self.queue.depth())["processing"], 1)
+        self.assertEqual(await self.queue.promote(), 1)
+        self.assertEqual(await self.queue.depth(), {"ready": 1, "delayed": 0, "processing": 0, "dead": 0})
+
+    async def test_processing_job_without_lease_is_leased(self):
+        # A worker that died between its BLMOVE and the lease
+        await self.queue.enqueue("greet", name="Jane")
+        raw = await self.redis.lmove(self.queue.key("ready"), self.queue.key("processing"), "RIGHT", "LEFT")
+        self.assertEqual(await self.queue.promote(), 0)
+        self.assertGreater(await self.redis.zscore(self.queue.key("leases"), raw), time.time())
+        # Once that lease runs out the job goes back to ready
+        await self.redis.zadd(self.queue.key("leases"), {raw: 0})
+        self.assertEqual(await self.queue.promote(), 1)
+        self.assertEqual(await self.queue.depth(), {"ready": 1, "delayed": 0, "processing": 0, "dead": 0})
+
+    async def test_work_until_stopped(self):
+        stop = asyncio.Event()
+        self.handler.side_effect = lambda **kwargs: stop.set()
+        await self.queue.enqueue("greet", name="Jane")
+        await asyncio.wait_for(self.queue.work(concurrency=2, stop=stop, poll=0.05), 5)
+        self.handler.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiosmtplib
+from fastapi_mail import ConnectionConfig, MessageSchema, MessageType
+
+from src.services.mailer import Mailer
+
+TEMPLATES = Path(__file__).parent.parent / "src" / "services" / "templates"
+
+
+def make_config() -> ConnectionConfig:
+    return ConnectionConfig(MAIL_USERNAME="user", MAIL_PASSWORD="secret", MAIL_FROM="noreply@example.com",
+                            MAIL_PORT=465, MAIL_SERVER="smtp.example.com", MAIL_STARTTLS=False, MAIL_SSL_TLS=True,
+                            TEMPLATE_FOLDER=TEMPLATES)
+
+
+def make_message(number: int = 0) -> MessageSchema:
+    return MessageSchema(subject="Confirm your email", recipients=[f"user{number}@example.com"],
+                         template_body={"host": "http://localhost/", "username": "user", "token": "token"},
+                         subtype=MessageType.html)
+
+
+class TestMailer(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.mailer = Mailer(make_config(), concurrency=1, batch_size=10, backoff=0)
+        self.smtp = MagicMock()
+        self.smtp.is_connected = True
+        self.smtp.send_message = AsyncMock()
+        self.smtp.quit = AsyncMock()
+        self.connect = patch.object(self.mailer, "_connect", AsyncMock(return_value=self.smtp)).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    async def test_messages_share_a_connection(self):
+        await asyncio.gather(*(self.mailer.send(make_message(number), template_name="email_template.html")
+                               for number in range(5)))
+        await self.mailer.stop()
+        self.assertEqual(self.connect.await_count, 1)
+        self.assertEqual(self.smtp.send_message.await_count, 5)
+        self.assertEqual(self.mailer.sent, 5)
+        self.smtp.quit.assert_awaited_once()
+        sent = self.smtp.send_message.await_args.args[0]
+        self.assertEqual(sent["To"], "user4@example.com")
+        body = sent.get_payload()[0].get_payload(decode=True).decode()
+        self.assertIn("http://localhost/api/auth/confirmed_email/token", body)
+
+    async def test_template_is_compiled_once(self):
+        template = self.mailer.template("email_template.html")
+        self.assertIs(self.mailer.template("email_template.html"), template)
+
+    async def test_failed_delivery_is_retried_on_a_new_connection(self):
+        self.smtp.send_message.side_effect = [aiosmtplib.SMTPServerDisconnected("gone"), None]
+        await self.mailer.send(make_message(), template_name="email_template.html")
+        await self.mailer.stop()
+        self.assertEqual((self.mailer.sent, self.mailer.retried, self.mailer.failed), (1, 1, 0))
+        self.assertEqual(self.connect.await_count, 2)
+
+    async def test_permanent_errors_are_not_retried(self):
+        self.smtp.send_message.side_effect = aiosmtplib.SMTPRecipientsRefused([])
+        with self.assertRaises(aiosmtplib.SMTPRecipientsRefused):
+            await self.mailer.send(make_message(), template_name="email_template.html")
+        await self.mailer.stop()
+        self.assertEqual((self.mailer.sent, self.mailer.retried, self.mailer.failed), (0, 0, 1))
+        self.smtp.send_message.assert_awaited_once()
+
+    async def test_gives_up_after_max_retries(self):
+        self.mailer.max_retries = 2
+        self.smtp.send_message.side_effect = aiosmtplib.SMTPServerDisconnected("gone")
+        with self.assertRaises(aiosmtplib.SMTPServerDisconnected):
+            await self.mailer.send(make_message(), template_name="email_template.html")
+        await self.mailer.stop()
+        self.assertEqual((self.mailer.sent, self.mailer.retried, self.mailer.failed), (0, 2, 1))
+        self.assertEqual(self.smtp.send_message.await_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+from src.services.metrics import register_counter
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_register_counter(self):
+        registry = CollectorRegistry()
+        total = [3]
+        register_counter("widgets_rejected", "Rejected widgets", lambda: total[0], registry=registry)
+        self.assertEqual(registry.get_sample_value("widgets_rejected_total"), 3)
+        total[0] = 5
+        self.assertEqual(registry.get_sample_value("widgets_rejected_total"), 5)
+        self.assertIn(b"# TYPE widgets_rejected_total counter", generate_latest(registry))
+
+    def test_register_counter_rejects_a_taken_name(self):
+        registry = CollectorRegistry()
+        register_counter("widgets_rejected", "Rejected widgets", lambda: 0, registry=registry)
+        with self.assertRaises(ValueError):
+            register_counter("widgets_rejected", "Rejected widgets", lambda: 0, registry=registry)
+
+
+if __name__ == '__main__':
+    unittest.main()
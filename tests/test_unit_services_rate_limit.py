@@ -0,0 +1,92 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import fakeredis.aioredis
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.database.models import User
+from src.services.rate_limit import RateLimiter, Limit
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        self.clock = Clock()
+
+    def limiter(self, limit="10/60", batch=0.1):
+        return RateLimiter(self.redis, limits={"read": limit}, batch=batch, clock=self.clock)
+
+    async def test_limit(self):
+        limiter = self.limiter("3/60")
+        self.assertEqual([await limiter.acquire(1, "GET /all", "read") for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(await limiter.acquire(1, "GET /all", "read"), 20)
+        self.assertEqual(await limiter.acquire(2, "GET /all", "read"), 0)
+        self.assertEqual(await limiter.acquire(1, "GET /bday", "read"), 0)
+
+    async def test_refill(self):
+        limiter = self.limiter("3/60")
+        for _ in range(3):
+            await limiter.acquire(1, "GET /all", "read")
+        self.clock.now += 10
+        self.assertAlmostEqual(await limiter.acquire(1, "GET /all", "read"), 10)
+        self.clock.now += 10
+        self.assertEqual(await limiter.acquire(1, "GET /all", "read"), 0)
+
+    async def test_tokens_are_taken_in_batches(self):
+        limiter = self.limiter("100/60")
+        with patch.object(self.redis, "eval", MagicMock(side_effect=self.redis.eval)) as eval_mock:
+            for _ in range(25):
+                self.assertEqual(await limiter.acquire(1, "GET /all", "read"), 0)
+        self.assertEqual(eval_mock.call_count, 3)
+        self.assertEqual(float(await self.redis.hget(limiter.key(1, "GET /all"), "tokens")), 70)
+
+    async def test_rejections_are_local_until_the_bucket_refills(self):
+        limiter = self.limiter("1/60")
+        await limiter.acquire(1, "GET /all", "read")
+        with patch.object(self.redis, "eval", MagicMock(side_effect=self.redis.eval)) as eval_mock:
+            self.assertGreater(await limiter.acquire(1, "GET /all", "read"), 0)
+            self.assertGreater(await limiter.acquire(1, "GET /all", "read"), 0)
+            self.clock.now += 61
+            self.assertEqual(await limiter.acquire(1, "GET /all", "read"), 0)
+        self.assertEqual(eval_mock.call_count, 2)
+
+    async def test_workers_share_the_bucket(self):
+        first, second = self.limiter("10/60", batch=0.5), self.limiter("10/60", batch=0.5)
+        allowed = 0
+        for _ in range(8):
+            allowed += await first.acquire(1, "GET /all", "read") == 0
+            allowed += await second.acquire(1, "GET /all", "read") == 0
+        self.assertEqual(allowed, 10)
+
+    async def test_dependency(self):
+        limiter = self.limiter("1/60")
+        dependency = limiter.limit("read")
+        self.assertEqual(dependency.description, "No more than 1 requests per 60 seconds")
+        request = Request({"type": "http", "method": "GET", "path": "/api/contacts/all", "headers": [],
+                           "route": SimpleNamespace(path="/api/contacts/all")})
+        await dependency(request, User(id=1))
+        with self.assertRaises(HTTPException) as error:
+            await dependency(request, User(id=1))
+        self.assertEqual(error.exception.status_code, 429)
+        self.assertEqual(error.exception.headers["Retry-After"], "60")
+
+    def test_parse_limit(self):
+        limit = Limit.parse("120/60")
+        self.assertEqual((limit.times, limit.seconds, limit.rate), (120, 60, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
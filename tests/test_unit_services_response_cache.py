@@ -0,0 +1,92 @@
+import unittest
+from datetime import date
+from unittest.mock import AsyncMock
+
+import fakeredis
+import fakeredis.aioredis
+import orjson
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.database.models import Contact
+from src.schemas import ResponseContact
+from src.services.response_cache import ResponseCache, etag_matches, render
+
+
+def make_request(path="/api/contacts/all", query="limit=10", if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+                    "headers": headers})
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        self.cache = ResponseCache(self.redis, ttl=60)
+        self.build = AsyncMock(return_value=(b'[{"id":1}]', {"X-Next-Cursor": "abc"}))
+
+    async def test_miss_then_hit(self):
+        first = await self.cache.respond(make_request(), 1, self.build)
+        second = await self.cache.respond(make_request(), 1, self.build)
+        self.assertEqual(self.build.await_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.body, b'[{"id":1}]')
+        self.assertEqual(second.headers["X-Next-Cursor"], "abc")
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+
+    async def test_key_depends_on_user_and_parameters(self):
+        await self.cache.respond(make_request(query="limit=10&cursor=x"), 1, self.build)
+        await self.cache.respond(make_request(query="cursor=x&limit=10"), 1, self.build)
+        self.assertEqual(self.build.await_count, 1)
+        await self.cache.respond(make_request(query="limit=20"), 1, self.build)
+        await self.cache.respond(make_request(query="limit=10&cursor=x"), 2, self.build)
+        await self.cache.respond(make_request(query="limit=10&cursor=x"), 1, self.build, extra={"today": "x"})
+        self.assertEqual(self.build.await_count, 4)
+
+    async def test_invalidate(self):
+        await self.cache.respond(make_request(), 1, self.build)
+        await self.cache.invalidate(2)
+        await self.cache.respond(make_request(), 1, self.build)
+        self.assertEqual(self.build.await_count, 1)
+        await self.cache.invalidate(1)
+        await self.cache.respond(make_request(), 1, self.build)
+        self.assertEqual(self.build.await_count, 2)
+
+    async def test_entry_built_before_a_write_is_not_served(self):
+        version, entry = await self.cache.get(1, "/p", [])
+        await self.cache.invalidate(1)
+        await self.cache.set(1, "/p", [], version, b"[]", {})
+        self.assertEqual(await self.cache.get(1, "/p", []), (1, None))
+
+    async def test_not_modified(self):
+        etag = (await self.cache.respond(make_request(), 1, self.build)).headers["ETag"]
+        response = await self.cache.respond(make_request(if_none_match=etag), 1, self.build)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.body, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(self.build.await_count, 1)
+
+    async def test_errors_are_not_cached(self):
+        self.build.side_effect = HTTPException(status_code=404)
+        with self.assertRaises(HTTPException):
+            await self.cache.respond(make_request(), 1, self.build)
+        self.assertEqual(await self.redis.keys("resp:*"), [])
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(etag_matches('W/"b"', '"b"'))
+        self.assertTrue(etag_matches('*', '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+        self.assertFalse(etag_matches(None, '"b"'))
+
+    def test_render(self):
+        contact = Contact(id=1, name="Bob", surname="Smith", email="bob@example.com", phone="+380501234567",
+                          birthday=date(1990, 1, 2), additionally="")
+        self.assertEqual(orjson.loads(render(ResponseContact, contact))["birthday"], "1990-01-02")
+        self.assertEqual(orjson.loads(render(ResponseContact, [{"id": 1, "name": "Bob"}], exclude_unset=True)),
+                         [{"id": 1, "name": "Bob"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
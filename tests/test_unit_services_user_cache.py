@@ -0,0 +1,33 @@
+import unittest
+
+import orjson
+
+from src.database.models import User
+from src.services.user_cache import dump_user, load_user, user_cache_key, USER_CACHE_VERSION
+
+
+class TestUserCache(unittest.TestCase):
+
+    def setUp(self):
+        self.user = User(id=1, username="Vitalii", email="vitalii@email.com", password="hash",
+                         avatar="https://example.com/a.png", refresh_token="token", confirmed=True)
+
+    def test_round_trip(self):
+        user = load_user(dump_user(self.user))
+        self.assertEqual((user.id, user.username, user.email, user.avatar, user.confirmed),
+                         (1, "Vitalii", "vitalii@email.com", "https://example.com/a.png", True))
+        self.assertIsNone(user.password)
+        self.assertIsNone(user.refresh_token)
+
+    def test_other_version_is_a_miss(self):
+        record = orjson.loads(dump_user(self.user))
+        record["v"] = USER_CACHE_VERSION + 1
+        self.assertIsNone(load_user(orjson.dumps(record)))
+        self.assertIsNone(load_user(b"\x80\x04not json"))
+
+    def test_key_is_versioned(self):
+        self.assertEqual(user_cache_key("a@b.c"), f"user:v{USER_CACHE_VERSION}:a@b.c")
+
+
+if __name__ == '__main__':
+    unittest.main()
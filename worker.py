@@ -0,0 +1,69 @@
+"""
+Background job worker: runs the jobs the API enqueues on the Redis job queue (confirmation emails and the like).
+
+    python worker.py [--concurrency N] [--metrics-port PORT] [--retry-dead]
+
+Run as many of them as needed, next to the API processes. SIGTERM / SIGINT stop taking new jobs,
+finish the running ones and flush the outgoing mail.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+from dotenv import load_dotenv
+from prometheus_client import start_http_server
+
+# Importing the modules that define jobs registers their handlers
+import src.services.avatar  # noqa: F401
+from src.services.email import mailer
+from src.services.jobs import job_queue
+from src.services.metrics import register_gauge, register_counter
+from src.services.redis_pool import close_redis
+
+load_dotenv()
+
+JOBS_CONCURRENCY = int(os.environ.get('JOBS_CONCURRENCY', 8))
+JOBS_METRICS_PORT = int(os.environ.get('JOBS_METRICS_PORT', 9100))
+
+
+async def run(args) -> None:
+    if args.retry_dead:
+        moved = await job_queue.retry_dead()
+        print(f"Moved {moved} dead jobs back to the queue")
+        await close_redis()
+        return
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    register_gauge("mail_queue_depth", "Emails waiting for an SMTP connection", lambda: mailer.depth)
+    register_counter("mail_failed", "Emails given up on after all SMTP retries", lambda: mailer.failed)
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    mailer.start()
+    logging.info("Worker running %d jobs at a time from queue %s", args.concurrency, job_queue.name)
+    try:
+        await job_queue.work(concurrency=args.concurrency, stop=stop)
+    finally:
+        await mailer.stop()
+        await close_redis()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=JOBS_CONCURRENCY, help="jobs run at the same time")
+    parser.add_argument("--metrics-port", type=int, default=JOBS_METRICS_PORT,
+                        help="port of the Prometheus endpoint, 0 to disable")
+    parser.add_argument("--retry-dead", action="store_true", help="requeue the dead letter jobs and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()